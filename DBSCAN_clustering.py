@@ -2,9 +2,17 @@ import pandas as pd
 import numpy as np
 from sklearn.cluster import DBSCAN
 from sklearn.preprocessing import StandardScaler
+import sys
 import json
+import codecs
+import argparse
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 def detect_table_regions(df):
     """Identify distinct table regions using density-based clustering"""
     # Get coordinates of all non-empty cells
@@ -31,22 +39,24 @@ def detect_table_regions(df):
             break
         eps -= 0.1  # Reduce eps if no clusters found
     
-    # Group cells by cluster
-    clusters = {}
-    for (row, col), label in zip(coords, labels):
-        if label not in clusters:
-            clusters[label] = {'rows': set(), 'cols': set()}
-        clusters[label]['rows'].add(row)
-        clusters[label]['cols'].add(col)
-    
-    # Convert to table regions
+    # Convert clusters to table regions
+    clustered = labels >= 0
     table_regions = []
-    for label, region in clusters.items():
-        if label == -1:  # Skip noise
-            continue
-        min_row, max_row = min(region['rows']), max(region['rows'])
-        min_col, max_col = min(region['cols']), max(region['cols'])
-        table_regions.append((min_row, max_row, min_col, max_col))
+    if clustered.any():
+        rows, cols, cluster_labels = coords[clustered, 0], coords[clustered, 1], labels[clustered]
+        n_labels = cluster_labels.max() + 1
+        min_rows = np.full(n_labels, np.iinfo(np.int64).max)
+        max_rows = np.full(n_labels, -1)
+        min_cols = np.full(n_labels, np.iinfo(np.int64).max)
+        max_cols = np.full(n_labels, -1)
+        np.minimum.at(min_rows, cluster_labels, rows)
+        np.maximum.at(max_rows, cluster_labels, rows)
+        np.minimum.at(min_cols, cluster_labels, cols)
+        np.maximum.at(max_cols, cluster_labels, cols)
+        table_regions = [
+            (int(min_rows[k]), int(max_rows[k]), int(min_cols[k]), int(max_cols[k]))
+            for k in range(n_labels)
+        ]
     
     return sorted(table_regions, key=lambda x: (x[0], x[2]))
 
@@ -66,44 +76,75 @@ def convert_to_serializable(obj):
         return {k: convert_to_serializable(v) for k, v in obj.items()}
     return str(obj) if not isinstance(obj, (str, int, float, bool)) else obj
 
-def extract_tables(df, table_regions):
-    """Extract tables from identified regions"""
-    tables = []
+def column_to_json(column):
+    """Converts one DataFrame column to a list of JSON-ready values in bulk"""
+    values = column.to_numpy(dtype=object)
+    missing = pd.isna(values)
+    if missing.any():
+        values = values.copy()
+        values[missing] = None
+    # Columns read with dtype=str hold only strings and blanks; anything else
+    # falls back to the per-value conversion
+    if pd.api.types.infer_dtype(values, skipna=True) not in ("string", "empty"):
+        values = np.array([convert_to_serializable(v) for v in values], dtype=object)
+    return values.tolist()
+
+def iter_tables(df, table_regions):
+    """Extract tables from identified regions, one at a time"""
     for i, (min_row, max_row, min_col, max_col) in enumerate(table_regions):
-        table_df = df.iloc[min_row:max_row+1, min_col:max_col+1].copy()
+        table_df = df.iloc[min_row:max_row+1, min_col:max_col+1]
         
         # Auto-detect headers
         first_row = table_df.iloc[0].dropna()
         if (len(first_row) > 0 and 
             all(isinstance(x, str) and x.strip().istitle() 
                 for x in first_row if pd.notna(x))):
-            table_df.columns = [str(col).strip() for col in table_df.iloc[0]]
+            table_df = table_df.set_axis([str(col).strip() for col in table_df.iloc[0]], axis=1)
             table_df = table_df[1:]
         
-        # Process table data
-        table_data = []
-        for _, row in table_df.iterrows():
-            cleaned_row = {}
-            for col, value in row.items():
-                cleaned_row[str(col)] = convert_to_serializable(value)
-            table_data.append(cleaned_row)
+        # Process table data column by column, then zip the columns into rows
+        keys = [str(col) for col in table_df.columns]
+        columns = [column_to_json(table_df.iloc[:, j]) for j in range(table_df.shape[1])]
+        table_data = [dict(zip(keys, row)) for row in zip(*columns)]
         
-        tables.append({
+        yield {
             "table_id": i,
             "bounds": {
                 "rows": (int(min_row), int(max_row)),
                 "cols": (int(min_col), int(max_col))
             },
             "data": table_data
-        })
-    return tables
+        }
+
+def extract_tables(df, table_regions):
+    """Extract tables from identified regions"""
+    return list(iter_tables(df, table_regions))
+
+def read_workbook(file_path):
+    """Read the first sheet of an Excel file without a header row"""
+    return pd.read_excel(file_path, header=None, dtype=str)  # Every column as string initially
+
+def write_json(obj, stream):
+    """Write obj as JSON to a binary stream, with orjson when it is installed"""
+    if orjson is not None:
+        stream.write(orjson.dumps(obj))
+    else:
+        json.dump(obj, codecs.getwriter("utf-8")(stream), ensure_ascii=False)
+
+def write_ndjson(records, stream):
+    """Write one JSON line per record, so large outputs never sit in memory as one document"""
+    count = 0
+    for record in records:
+        write_json(record, stream)
+        stream.write(b"\n")
+        count += 1
+    return count
 
 def process_sheet_to_json(file_path):
     """Process an Excel sheet to JSON with automatic table detection"""
     try:
-        # Read Excel with date parsing
-        df = pd.read_excel(file_path, header=None, 
-                          converters={i: str for i in range(100)})  # Convert all columns to string initially
+        # Read Excel with every cell as text
+        df = read_workbook(file_path)
         
         # Detect table regions
         table_regions = detect_table_regions(df)
@@ -118,8 +159,40 @@ def process_sheet_to_json(file_path):
     except Exception as e:
         return {"error": f"Processing failed: {str(e)}"}
 
+def export_sheet_json(file_path, stream, ndjson=False):
+    """
+    Process an Excel sheet and write the result straight to a binary stream.
+    With ndjson=True every table is written as its own line as soon as it is
+    extracted; otherwise the stream gets the same document as process_sheet_to_json.
+    Returns the number of tables written.
+    """
+    if not ndjson:
+        result = process_sheet_to_json(file_path)
+        write_json(result, stream)
+        return len(result.get("tables", []))
+    
+    try:
+        df = read_workbook(file_path)
+        table_regions = detect_table_regions(df)
+    except Exception as e:
+        write_ndjson([{"error": f"Processing failed: {str(e)}"}], stream)
+        return 0
+    if not table_regions:
+        write_ndjson([{"error": "No tables detected in sheet"}], stream)
+        return 0
+    return write_ndjson(iter_tables(df, table_regions), stream)
+
 # Example usage
 if __name__ == "__main__":
-    file_path = "example.xlsx"
-    result = process_sheet_to_json(file_path)
-    print(json.dumps(result, indent=4, ensure_ascii=False))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Detect tables in an Excel sheet and export them as JSON.")
+    parser.add_argument("file_path", nargs="?", default="example.xlsx")
+    parser.add_argument("--output", help="Output file (default: stdout)")
+    parser.add_argument("--ndjson", action="store_true", help="Write one table per line")
+    args = parser.parse_args()
+    
+    if args.output:
+        with open(args.output, "wb") as f:
+            export_sheet_json(args.file_path, f, args.ndjson)
+    else:
+        export_sheet_json(args.file_path, sys.stdout.buffer, args.ndjson)
+        sys.stdout.buffer.write(b"\n")
@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import uuid
+import queue
+import base64
+import shutil
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from modules.sheetprocessor import detect_tables
+from modules.evaluationdetection import detect_tables_bbox
+from modules.instrumentation import span, add_sink, PrometheusSink
+
+WORK_DIR = os.path.join(".cache", "api")
+MAX_BODY_BYTES = 256 * 2 ** 20
+
+# pyplot keeps global figure state, so visualized detections run one at a time
+_plot_lock = threading.Lock()
+
+
+def gemini_answer(question, json_file_path):
+    """
+    Default answer function: Gemini over the tables detected for this file.
+    Job outputs are deleted after one answer, so no shared sheet context
+    (or provider cache) is created for them.
+    """
+    from modules.geminis import generate
+    return generate(question, json_file_path)
+
+
+class BusyError(Exception):
+    """The pending-file queue cannot take the whole batch."""
+
+
+class BatchService:
+    """
+    Runs detection and QA jobs on a worker pool. At most `queue_size` files are
+    pending or running at once; a batch that does not fit is rejected whole.
+    :param answer_fn: answer_fn(question, json_file_path) -> str, e.g. a stub
+        for offline use. Defaults to Gemini.
+    """
+
+    def __init__(self, workers=2, queue_size=16, answer_fn=None, work_dir=WORK_DIR):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.answer_fn = answer_fn or gemini_answer
+        self.work_dir = work_dir
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sheetqa-api")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.counters = {"batches": 0, "files": 0, "rejected_batches": 0, "failed_files": 0}
+
+    def pending(self):
+        with self._lock:
+            return self._pending
+
+    def submit(self, files, mode="tables", question=None, sheet_name=None, visualize=False):
+        """
+        Queues one job per file.
+        :param files: [{"name": ..., "content": base64} or {"path": ...}, ...]
+        :return: queue.Queue receiving one result dict per file, in finishing order.
+        :raises BusyError: When the batch does not fit in the queue.
+        """
+        with self._lock:
+            if self._pending + len(files) > self.queue_size:
+                self.counters["rejected_batches"] += 1
+                raise BusyError(f"{self._pending} file(s) pending, queue holds {self.queue_size}")
+            self._pending += len(files)
+            self.counters["batches"] += 1
+            self.counters["files"] += len(files)
+
+        results = queue.Queue()
+        for spec in files:
+            job_dir = os.path.join(self.work_dir, uuid.uuid4().hex)
+            self._pool.submit(self._run, results, spec, job_dir, mode, question, sheet_name, visualize)
+        return results
+
+    def _run(self, results, spec, job_dir, mode, question, sheet_name, visualize):
+        name = None
+        start = time.perf_counter()
+        try:
+            name = spec.get("name") or os.path.basename(spec.get("path", ""))
+            with span("api.job", mode=mode, file=name):
+                result = self._process(spec, name, job_dir, mode, question, sheet_name, visualize)
+            result.update(file=name, status="ok")
+        except Exception as e:
+            with self._lock:
+                self.counters["failed_files"] += 1
+            result = {"file": name, "status": "error", "error": str(e)}
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            with self._lock:
+                self._pending -= 1
+        result["elapsed_seconds"] = time.perf_counter() - start
+        results.put(result)
+
+    def _process(self, spec, name, job_dir, mode, question, sheet_name, visualize):
+        os.makedirs(job_dir, exist_ok=True)
+        if "content" in spec:
+            file_path = os.path.join(job_dir, os.path.basename(name) or "upload.xlsx")
+            with open(file_path, "wb") as f:
+                f.write(base64.b64decode(spec["content"]))
+        elif "path" in spec:
+            file_path = spec["path"]
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(f"File '{file_path}' not found")
+        else:
+            raise ValueError("Each file needs a 'content' (base64) or a 'path'")
+
+        if mode == "bbox":
+            return {"tables": detect_tables_bbox(file_path, sheet_name)}
+
+        json_file_path = os.path.join(job_dir, "tables.json")
+        image_path = os.path.join(job_dir, "table_detection.png")
+        if visualize:
+            with _plot_lock:
+                num_tables, image_path = detect_tables(file_path, True, json_file_path, image_path)
+        else:
+            num_tables, image_path = detect_tables(file_path, False, json_file_path, image_path)
+
+        result = {"total_tables": num_tables}
+        if num_tables and os.path.exists(json_file_path):
+            with open(json_file_path, "r", encoding="utf-8") as f:
+                result["detection"] = json.load(f)
+        if image_path and os.path.exists(image_path):
+            with open(image_path, "rb") as f:
+                result["image_png"] = base64.b64encode(f.read()).decode("ascii")
+        if mode == "ask":
+            result["question"] = question
+            result["answer"] = self.answer_fn(question, json_file_path) if num_tables else None
+        return result
+
+    def render_metrics(self):
+        """Queue gauges and batch counters in the Prometheus text format."""
+        with self._lock:
+            pending, counters = self._pending, dict(self.counters)
+        lines = [
+            "# HELP sheetqa_api_pending_files Files queued or running.",
+            "# TYPE sheetqa_api_pending_files gauge",
+            f"sheetqa_api_pending_files {pending}",
+            "# HELP sheetqa_api_queue_capacity Maximum pending files.",
+            "# TYPE sheetqa_api_queue_capacity gauge",
+            f"sheetqa_api_queue_capacity {self.queue_size}",
+        ]
+        for key, value in counters.items():
+            lines.append(f"# TYPE sheetqa_api_{key}_total counter")
+            lines.append(f"sheetqa_api_{key}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+def make_handler(service, metrics_sink):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _write_chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path == "/healthz":
+                self._send_json(200, {
+                    "status": "ok",
+                    "workers": service.workers,
+                    "pending_files": service.pending(),
+                    "queue_size": service.queue_size
+                })
+            elif self.path == "/metrics":
+                body = (metrics_sink.render() + service.render_metrics()).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            mode = {"/detect": "tables", "/detect_bbox": "bbox", "/ask": "ask"}.get(self.path)
+            if mode is None:
+                return self._send_json(404, {"error": "Not found"})
+
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                self.close_connection = True
+                return self._send_json(413, {"error": f"Body larger than {MAX_BODY_BYTES} bytes"})
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+                files = request["files"]
+                if not isinstance(files, list) or not files:
+                    raise ValueError("'files' must be a non-empty list")
+                for spec in files:
+                    if not isinstance(spec, dict) or not ("content" in spec or "path" in spec):
+                        raise ValueError("each file must be an object with a 'content' or a 'path'")
+                if mode == "ask" and not request.get("question"):
+                    raise ValueError("'question' is required")
+            except (ValueError, KeyError, TypeError) as e:
+                return self._send_json(400, {"error": f"Bad request: {e}"})
+
+            if len(files) > service.queue_size:
+                return self._send_json(413, {"error": f"Batches hold at most {service.queue_size} files"})
+            try:
+                results = service.submit(
+                    files, mode, request.get("question"), request.get("sheet_name"), bool(request.get("visualize"))
+                )
+            except BusyError as e:
+                return self._send_json(429, {"error": f"Busy: {e}"}, {"Retry-After": "1"})
+
+            # One NDJSON line per file, as soon as it finishes
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for _ in files:
+                self._write_chunk(json.dumps(results.get()).encode("utf-8") + b"\n")
+            self._write_chunk(b"")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8080, workers=2, queue_size=16, answer_fn=None, work_dir=WORK_DIR,
+          metrics_sink=None):
+    """
+    Starts the API in a daemon thread.
+    Endpoints: POST /detect, /detect_bbox and /ask with
+    {"files": [{"name": "a.xlsx", "content": "<base64>"} | {"path": "files/a.xlsx"}],
+     "question": "...", "sheet_name": ..., "visualize": false},
+    GET /healthz and GET /metrics.
+    :param metrics_sink: PrometheusSink to expose; a new one is registered by default.
+    :return: (server, service); call server.shutdown() and service.shutdown() to stop.
+    """
+    metrics_sink = metrics_sink or add_sink(PrometheusSink())
+    service = BatchService(workers, queue_size, answer_fn, work_dir)
+    server = ThreadingHTTPServer((host, port), make_handler(service, metrics_sink))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, service
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local batch HTTP API for table detection and QA.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=16, help="Maximum files pending at once")
+    args = parser.parse_args()
+
+    server, service = serve(args.host, args.port, args.workers, args.queue_size)
+    print(f"🚀 API listening on http://{args.host}:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        service.shutdown()
@@ -1,15 +1,93 @@
 import os
+import threading
 from config.config import bot
-from modules.sheetprocessor import detect_tables
+from modules.incrementaldetection import detect_tables_incremental, render_state, state_path
 from modules.jsonqa import JsonQuestionAnswering
 from modules.csvqa import CSVPromptQA
-from modules.geminis import generate
+from modules.geminis import generate_in_session
+from modules.answercache import AnswerCache, artifact_hash, EMBEDDING_MODEL
+from modules.uploadstore import UploadStore
+from modules.valueindex import value_index_path
 from telebot import asyncio_helper
 
 
-user_files = {}  # { user_id: [file_path1, file_path2, ...] }
-user_sessions = {}  # {user_id: {'sheet_name': ..., 'question': ...}}
-qa_instances = {}  # { sheet_name: JsonQuestionAnswering }
+# Uploads, detection artifacts and sessions survive restarts; old uploads are
+# evicted once the store outgrows UPLOAD_QUOTA_MB
+store = UploadStore(quota_bytes=int(os.environ.get("UPLOAD_QUOTA_MB", 1024)) * 2 ** 20)
+store.start_eviction()
+# Incremental detection state, registered as an artifact of the latest upload
+# of each (user, file name) so that it is counted and evicted with it
+STATE_DIR = os.path.join(store.root, "states")
+# One lock per upload hash and per detection state: concurrent requests write
+# the same artifact files
+_locks = {}
+_locks_guard = threading.Lock()
+# Answers keyed by tables.json hash + normalized question. Setting
+# ANSWER_CACHE_SIMILARITY (e.g. 0.92) also serves answers to similar questions,
+# embedded with ANSWER_CACHE_EMBEDDING_MODEL
+answer_cache = AnswerCache(
+    similarity_threshold=float(os.environ["ANSWER_CACHE_SIMILARITY"]) if os.environ.get("ANSWER_CACHE_SIMILARITY") else None,
+    embedding_model=os.environ.get("ANSWER_CACHE_EMBEDDING_MODEL", EMBEDDING_MODEL)
+)
+
+
+def resolve_sheet(user_id, file_name):
+    """
+    Finds a user's upload by file name. Sheets that were placed in files/
+    directly are registered on first use.
+    :return: (file path, content hash) or None
+    """
+    found = store.resolve(user_id, file_name)
+    if found is None:
+        legacy_path = os.path.join("files", file_name)
+        if not os.path.isfile(legacy_path):
+            return None
+        with open(legacy_path, 'rb') as f:
+            file_path, digest, _ = store.put(user_id, file_name, f.read())
+        found = (file_path, digest)
+    return found
+
+
+def _lock(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def detect_sheet(user_id, file_name, file_path, digest, visualize=False):
+    """
+    Detects the tables of an upload into its artifact directory, reusing an
+    earlier detection of the same content.
+    :return: (number of tables, tables.json path, image path or None)
+    """
+    # Re-uploads of an edited workbook only re-detect the changed regions
+    state_key = f"{user_id}/{file_name}"
+    state_kind = f"detection_state/{state_key}"
+    with _lock(digest), _lock(state_key):
+        detected = store.artifact(digest, "tables_json")
+        image = store.artifact(digest, "image")
+        if detected and (image or not visualize):
+            return detected[1]["num_tables"], detected[0], image[0] if image else None
+
+        json_path = store.artifact_path(digest, "tables.json")
+        image_path = store.artifact_path(digest, "table_detection.png")
+        if detected and store.artifact(digest, state_kind):
+            # Detected without an image before: draw it from the stored result
+            image_path = render_state(state_key, image_path, STATE_DIR)
+            if image_path:
+                store.add_artifact(digest, "image", image_path)
+            return detected[1]["num_tables"], detected[0], image_path
+
+        num_tables, image_path = detect_tables_incremental(
+            file_path, visualize, json_path, image_path, STATE_DIR, state_key
+        )
+        store.add_artifact(digest, "tables_json", json_path, {"num_tables": num_tables})
+        if os.path.exists(state_path(state_key, STATE_DIR)):
+            store.add_artifact(digest, state_kind, state_path(state_key, STATE_DIR))
+        if os.path.exists(value_index_path(json_path)):
+            store.add_artifact(digest, "value_index", value_index_path(json_path))
+        if image_path:
+            store.add_artifact(digest, "image", image_path)
+        return num_tables, json_path, image_path
 
 @bot.message_handler(commands=['start', 'hello'])
 def send_welcome(message):
@@ -31,15 +109,9 @@ def handle_upload(message):
     file_info = bot.get_file(message.document.file_id)
     downloaded_file = bot.download_file(file_info.file_path)
 
-    os.makedirs("files", exist_ok=True)
-    file_path = os.path.join("files", message.document.file_name)
-    with open(file_path, 'wb') as f:
-        f.write(downloaded_file)
-
-    # Save uploaded file per user
-    if user_id not in user_files:
-        user_files[user_id] = []
-    user_files[user_id].append(file_path)
+    # Save uploaded file per user; identical files are stored once. Cached
+    # answers need no invalidation: they are keyed by the detected tables' hash
+    store.put(user_id, message.document.file_name, downloaded_file)
 
     bot.reply_to(message,
         f"✅ File '{message.document.file_name}' uploaded successfully.\n\n"
@@ -57,11 +129,12 @@ def handle_detect_tables(message):
             return
 
         sheet_name = args[1]
-        file_path = f"files/{sheet_name}.xlsx"
+        found = resolve_sheet(message.from_user.id, f"{sheet_name}.xlsx")
 
-        if not os.path.exists(file_path):
+        if found is None:
             bot.reply_to(message, f"❌ File '{sheet_name}.xlsx' not found.")
             return
+        file_path, digest = found
         
         # Send loading GIF animation
         loading_gif_path = "files/assets/loading2.gif"
@@ -76,7 +149,9 @@ def handle_detect_tables(message):
         else:
             bot.reply_to(message, "⚠️ Loading animation not found, proceeding with detection...")
 
-        num_tables, image_path = detect_tables(file_path, visualize=True)
+        num_tables, _, image_path = detect_sheet(
+            message.from_user.id, f"{sheet_name}.xlsx", file_path, digest, visualize=True
+        )
 
         reply_msg = f"✅ Detected {num_tables} table(s) in '{sheet_name}.xlsx'."
         bot.reply_to(message, reply_msg)
@@ -98,10 +173,23 @@ def handle_question(message):
 
         sheet_name = parts[1].strip("'\"")
         question = parts[2].strip("'\"")
-        file_path = os.path.join("files", sheet_name)
+        found = resolve_sheet(message.from_user.id, sheet_name)
 
-        if not os.path.exists(file_path):
+        if found is None:
             return bot.reply_to(message, f"❌ File '{sheet_name}' not found.")
+        file_path, digest = found
+
+        # Save user session
+        store.set_session(message.from_user.id, sheet_name=sheet_name, question=question)
+
+        # Questions are answered from this sheet's own detected tables
+        _, json_path, _ = detect_sheet(message.from_user.id, sheet_name, file_path, digest)
+
+        # Repeated questions about the same detected tables skip the LLM call
+        artifact = artifact_hash(json_path)
+        answer = answer_cache.get(sheet_name, artifact, question)
+        if answer is not None:
+            return bot.send_message(message.chat.id, f"💡 Answer:\n{answer}")
 
         # Send italicized waiting message
         bot.send_chat_action(message.chat.id, 'typing')
@@ -110,13 +198,10 @@ def handle_question(message):
         with open(loading_gif_path, 'rb') as gif:
             loading_msg = bot.send_animation(message.chat.id, gif, caption="_Generating your answer, might take up to 1 minute..._", parse_mode="Markdown")
 
-        # Save user session
-        user_sessions[message.from_user.id] = {
-            'sheet_name': sheet_name,
-            'question': question
-        }
-
-        answer = generate(question=question)
+        # Shares the sheet's cached context with earlier and concurrent questions
+        answer = generate_in_session(question, json_path)
+        if answer:
+            answer_cache.put(sheet_name, artifact, question, answer)
 
         # Delete loading gif
         bot.delete_message(message.chat.id, loading_msg.message_id)
@@ -125,4 +210,14 @@ def handle_question(message):
         bot.send_message(message.chat.id, f"💡 Answer:\n{answer}")
 
     except Exception as e:
-        bot.reply_to(message, f"⚠️ Error: {e}")
\ No newline at end of file
+        bot.reply_to(message, f"⚠️ Error: {e}")
+
+@bot.message_handler(commands=['cache_stats'])
+def handle_cache_stats(message):
+    stats = answer_cache.stats()
+    bot.reply_to(message,
+        f"📊 Answer cache: {stats['entries']} cached answer(s)\n"
+        f"Hit rate: {stats['hit_rate']:.0%} of {stats['lookups']} question(s) "
+        f"({stats['exact_hits']} exact, {stats['semantic_hits']} similar)\n"
+        f"Evicted: {stats['evictions']}, expired: {stats['expirations']}, invalidated: {stats['invalidations']}"
+    )
\ No newline at end of file
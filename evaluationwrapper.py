@@ -1,5 +1,6 @@
 import os
 import json
+import time
 import pandas as pd
 from tqdm import tqdm
 from modules.evaluationdetection import detect_tables_bbox  # Assuming this is your detection function
@@ -21,10 +22,12 @@ for _, row in tqdm(df.iterrows(), total=len(df)):
 
     try:
         # Run table detection only on the first sheet
+        start = time.perf_counter()
         bboxes = detect_tables_bbox(path, first_sheet)
         output_json = {
             "spreadsheet": spreadsheet,
-            "tables": bboxes
+            "tables": bboxes,
+            "elapsed_seconds": time.perf_counter() - start
         }
 
         json_name = f"{spreadsheet}_pred.json"  # <- Spaces are now preserved
@@ -1,8 +1,11 @@
 # from bot.routes import bot
 from modules.sheetprocessor import detect_tables
 from modules.csvqa import CSVPromptQA
+from modules.instrumentation import configure_from_env
 
 if __name__ == "__main__":
+    # Optional tracing: SHEETQA_TRACE_FILE / SHEETQA_METRICS_PORT
+    configure_from_env()
 
     # This tests table detection
     file_path = "files/report2.xlsx"
@@ -11,4 +14,6 @@ if __name__ == "__main__":
 
     # This runs the bot
     # print("🤖 Bot is running...")
-    # bot.infinity_polling()
\ No newline at end of file
+    # bot.infinity_polling()
+
+    # The local batch HTTP API runs on its own: python -m api.server --port 8080
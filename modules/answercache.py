@@ -0,0 +1,167 @@
+import os
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from modules.instrumentation import span
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"  # Same model as jsonqa
+
+
+def normalize_question(question):
+    """
+    Canonical form of a question for exact cache hits: case, Unicode
+    compatibility forms, spacing and a trailing "?" or "." are ignored.
+    Operators, signs and other punctuation are kept, so "fare > 50" and
+    "fare < 50" stay apart ("What is the TOTAL for 2023?" == "what is the total for 2023").
+    """
+    text = " ".join(unicodedata.normalize("NFKC", question).casefold().split())
+    return re.sub(r"[\s?.]+$", "", text)
+
+
+def artifact_hash(json_file_path="tables.json"):
+    """Content hash of the detected-tables artifact the answers are generated from."""
+    digest = hashlib.sha1()
+    with open(json_file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    """
+    In-memory LLM answer cache. Entries are keyed by (artifact hash, normalized
+    question), expire after `ttl` seconds and are evicted least recently used
+    beyond `max_entries`. Re-detecting a sheet changes its artifact hash, so stale
+    answers are never served; invalidate() also drops a sheet's entries eagerly.
+
+    With `similarity_threshold` set, a miss falls back to the closest cached
+    question for the same artifact whose embedding cosine similarity reaches the
+    threshold (e.g. 0.92).
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS,
+                 similarity_threshold=None, embedding_model=EMBEDDING_MODEL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embedding_model = embedding_model
+        self._embeddings = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0,
+                       "expirations": 0, "invalidations": 0}
+
+    def _embed(self, text):
+        if self._embeddings is None:
+            # Only loaded when the semantic tier is switched on
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            self._embeddings = HuggingFaceEmbeddings(model_name=self.embedding_model)
+        vector = np.asarray(self._embeddings.embed_query(text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        self._stats["expirations"] += len(expired)
+
+    def get(self, sheet_name, artifact, question):
+        """Returns the cached answer or None."""
+        normalized = normalize_question(question)
+        key = (artifact, normalized)
+        with span("answer_cache.get", sheet=sheet_name) as stage:
+            with self._lock:
+                self._expire(time.time())
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self._stats["exact_hits"] += 1
+                    stage.set(exact_hits=1)
+                    return entry["answer"]
+                candidates = [
+                    (k, e["embedding"]) for k, e in self._entries.items()
+                    if k[0] == artifact and e["embedding"] is not None
+                ]
+
+            if self.similarity_threshold is None or not candidates:
+                return self._miss(stage)
+
+            query = self._embed(normalized)
+            keys, vectors = zip(*candidates)
+            similarity = np.stack(vectors) @ query
+            best = int(np.argmax(similarity))
+            if similarity[best] < self.similarity_threshold:
+                return self._miss(stage)
+
+            with self._lock:
+                entry = self._entries.get(keys[best])
+                if entry is not None:
+                    self._entries.move_to_end(keys[best])
+                    self._stats["semantic_hits"] += 1
+            if entry is None:
+                # Evicted while the question was being embedded
+                return self._miss(stage)
+            stage.set(semantic_hits=1, similarity=float(similarity[best]))
+            return entry["answer"]
+
+    def _miss(self, stage):
+        with self._lock:
+            self._stats["misses"] += 1
+        stage.set(misses=1)
+        return None
+
+    def put(self, sheet_name, artifact, question, answer):
+        normalized = normalize_question(question)
+        embedding = self._embed(normalized) if self.similarity_threshold is not None else None
+        with self._lock:
+            self._entries[(artifact, normalized)] = {
+                "sheet_name": sheet_name,
+                "answer": answer,
+                "embedding": embedding,
+                "created_at": time.time()
+            }
+            self._entries.move_to_end((artifact, normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def get_or_generate(self, sheet_name, question, generate_fn, json_file_path="tables.json"):
+        """
+        Answers from the cache when possible, otherwise calls generate_fn(question)
+        and caches a non-empty answer. Without a tables.json there is no artifact
+        to key on, so the answer is generated and not cached.
+        :return: (answer, whether it came from the cache)
+        """
+        if not os.path.exists(json_file_path):
+            return generate_fn(question), False
+        artifact = artifact_hash(json_file_path)
+        answer = self.get(sheet_name, artifact, question)
+        if answer is not None:
+            return answer, True
+        answer = generate_fn(question)
+        if answer:
+            self.put(sheet_name, artifact, question, answer)
+        return answer, False
+
+    def invalidate(self, sheet_name):
+        """Drops every answer about a sheet, e.g. after it is re-uploaded."""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry["sheet_name"] == sheet_name]
+            for key in stale:
+                del self._entries[key]
+            self._stats["invalidations"] += len(stale)
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["lookups"] = lookups
+        stats["hit_rate"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        return stats
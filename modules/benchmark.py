@@ -0,0 +1,328 @@
+import os
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from datetime import datetime
+import matplotlib
+matplotlib.use("Agg")
+from openpyxl import Workbook
+import DBSCAN_clustering
+from modules import instrumentation
+from modules.sheetreader import read_sheet, occupied_cells
+from modules.parameters import suggest_eps
+from modules.evaluationdetection import cluster_cells, table_boxes
+from modules.sheetprocessor import detect_tables
+
+BENCHMARK_DIR = os.path.join(".cache", "benchmark")
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+LAYOUTS = ("many_small", "few_big")
+# detect_table_regions searches neighbors within 1.5 standard deviations, so its
+# pairs grow with the square of the cell count: about 0.9 GB peak at 10k cells,
+# 2.7 GB at 20k. Larger sheets (the synthetic ones, not Titanic.xlsx's 10.7k
+# cells) are skipped for process_sheet_to_json.
+PROCESS_SHEET_MAX_CELLS = 12_000
+
+
+class CaseSkipped(Exception):
+    """A pipeline does not run on this input by design (too large, ...)."""
+
+
+def make_synthetic_sheet(n_cells, layout, output_dir=BENCHMARK_DIR, seed=0):
+    """
+    Writes (once) an .xlsx file with roughly n_cells filled cells.
+    :param layout: "many_small" for a grid of 10x8 tables, "few_big" for four
+        20-column tables stacked vertically.
+    :return: Path of the generated workbook.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"synthetic_{layout}_{n_cells}.xlsx")
+    if os.path.exists(path):
+        return path
+
+    if layout == "many_small":
+        table_rows, table_cols, n_tables = 10, 8, max(1, n_cells // 80)
+    elif layout == "few_big":
+        table_cols, n_tables = 20, 4
+        table_rows = max(2, n_cells // (table_cols * n_tables))
+    else:
+        raise ValueError(f"Unknown layout: {layout}")
+
+    gap = 2
+    tables_per_band = max(1, int(n_tables ** 0.5)) if layout == "many_small" else 1
+    n_bands = -(-n_tables // tables_per_band)
+    headers = ["Name", "Amount", "Date", "Status", "Price", "Qty", "Category", "Email"]
+    statuses = ["open", "closed", "pending"]
+    rng = random.Random(seed)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for band in range(n_bands):
+        band_tables = min(tables_per_band, n_tables - band * tables_per_band)
+        for r in range(table_rows):
+            row = []
+            for t in range(band_tables):
+                for c in range(table_cols):
+                    name = headers[c % len(headers)]
+                    if r == 0:
+                        row.append(name if c < len(headers) else f"{name} {c}")
+                    elif name in ("Amount", "Price", "Qty"):
+                        row.append(round(rng.random() * 1000, 2))
+                    elif name == "Status":
+                        row.append(rng.choice(statuses))
+                    else:
+                        row.append(f"{name.lower()}_{band}_{t}_{r}")
+                row.extend([None] * gap)
+            ws.append(row)
+        for _ in range(gap):
+            ws.append([])
+    wb.save(path)
+    return path
+
+
+class StageTimer:
+    """Runs pipeline stages, recording wall time and (optionally) traced peak memory."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, name, fn, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        stage = {"seconds": elapsed}
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            stage["peak_mb"] = (peak - before) / 2 ** 20
+        self.stages[name] = stage
+        return result
+
+    def run_traced(self, root_name, fn, *args, **kwargs):
+        """
+        Runs an instrumented function (see modules.instrumentation) and records
+        the direct child spans of its `root_name` span as the stages.
+        """
+        sink = instrumentation.add_sink(_StageSpans(self.trace_memory))
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            instrumentation.remove_sink(sink)
+        self.stages.update(sink.stages(root_name))
+        return result
+
+
+class _StageSpans:
+    """Sink keeping finished spans, with the traced peak memory since the previous one."""
+
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.records = []
+        if trace_memory:
+            tracemalloc.reset_peak()
+            self._base, _ = tracemalloc.get_traced_memory()
+
+    def emit(self, record):
+        peak = 0
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            peak -= self._base
+            tracemalloc.reset_peak()
+            self._base = current
+        self.records.append((record, peak))
+
+    def stages(self, root_name):
+        roots = [record["span_id"] for record, _ in self.records if record["name"] == root_name]
+        stages = {}
+        peak = 0
+        # Spans finish children first, so a stage's peak covers its nested spans
+        for record, record_peak in self.records:
+            peak = max(peak, record_peak)
+            if record["parent_id"] in roots:
+                stages[record["name"]] = {"seconds": record["duration_ms"] / 1000}
+                if self.trace_memory:
+                    stages[record["name"]]["peak_mb"] = peak / 2 ** 20
+                peak = 0
+        return stages
+
+
+def bench_detect_tables(path, timer, work_dir):
+    timer.run_traced("detect_tables", detect_tables, path, True,
+                     os.path.join(work_dir, "tables.json"), os.path.join(work_dir, "table_detection.png"))
+
+
+def bench_detect_tables_bbox(path, timer, work_dir):
+    df_original = timer.run("read", read_sheet, path)
+    cell_indices = occupied_cells(df_original)
+    if len(cell_indices) == 0:
+        return
+    eps, _ = timer.run("eps_selection", suggest_eps, cell_indices)
+    labels = timer.run("clustering", cluster_cells, cell_indices, eps, 2)
+    timer.run("boxes", table_boxes, cell_indices, labels)
+
+
+def bench_process_sheet_to_json(path, timer, work_dir):
+    df = timer.run("read", DBSCAN_clustering.read_workbook, path)
+    n_cells = int(df.notna().values.sum())
+    if n_cells > PROCESS_SHEET_MAX_CELLS:
+        raise CaseSkipped(f"{n_cells} cells, above PROCESS_SHEET_MAX_CELLS ({PROCESS_SHEET_MAX_CELLS})")
+    regions = timer.run("clustering", DBSCAN_clustering.detect_table_regions, df)
+    tables = timer.run("extraction", DBSCAN_clustering.extract_tables, df, regions)
+    with open(os.path.join(work_dir, "process_sheet.json"), "wb") as f:
+        timer.run("json_output", DBSCAN_clustering.write_json, {"tables": tables}, f)
+
+
+PIPELINES = {
+    "detect_tables": bench_detect_tables,
+    "detect_tables_bbox": bench_detect_tables_bbox,
+    "process_sheet_to_json": bench_process_sheet_to_json,
+}
+
+
+def run_case(pipeline, path, repeat=1, trace_memory=True):
+    """
+    Benchmarks one pipeline on one workbook. Wall times are the best of
+    `repeat` untraced runs; peak memory comes from one extra traced run.
+    """
+    bench = PIPELINES[pipeline]
+    best = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for _ in range(repeat):
+            gc.collect()
+            timer = StageTimer()
+            bench(path, timer, work_dir)
+            for name, stage in timer.stages.items():
+                if name not in best or stage["seconds"] < best[name]["seconds"]:
+                    best[name] = stage
+        if trace_memory:
+            gc.collect()
+            tracemalloc.start()
+            try:
+                timer = StageTimer(trace_memory=True)
+                bench(path, timer, work_dir)
+            finally:
+                tracemalloc.stop()
+            for name, stage in timer.stages.items():
+                best[name]["peak_mb"] = stage["peak_mb"]
+
+    return {
+        "pipeline": pipeline,
+        "input": os.path.basename(path),
+        "stages": best,
+        "total_seconds": sum(stage["seconds"] for stage in best.values())
+    }
+
+
+def collect_inputs(files_dir="files", sizes=DEFAULT_SIZES, layouts=LAYOUTS):
+    paths = sorted(
+        os.path.join(files_dir, f) for f in os.listdir(files_dir) if f.endswith((".xlsx", ".xls"))
+    )
+    for n_cells in sizes:
+        for layout in layouts:
+            paths.append(make_synthetic_sheet(n_cells, layout))
+    return paths
+
+
+def run_benchmarks(paths, pipelines=tuple(PIPELINES), repeat=1, trace_memory=True):
+    """
+    Runs every pipeline on every input. Failing cases are kept with an "error"
+    (and count as regressions in compare()), skipped ones with a "skipped" reason.
+    """
+    results = []
+    for path in paths:
+        for pipeline in pipelines:
+            try:
+                case = run_case(pipeline, path, repeat, trace_memory)
+            except CaseSkipped as e:
+                print(f"Skipped {pipeline} on {path}: {e}")
+                results.append({"pipeline": pipeline, "input": os.path.basename(path), "skipped": str(e),
+                                "stages": {}, "total_seconds": None})
+                continue
+            except Exception as e:
+                print(f"Error benchmarking {pipeline} on {path}: {e}")
+                results.append({"pipeline": pipeline, "input": os.path.basename(path), "error": str(e),
+                                "stages": {}, "total_seconds": None})
+                continue
+            print(f"{pipeline:<22} {case['input']:<40} {case['total_seconds']:>8.3f}s")
+            results.append(case)
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cases": results
+    }
+
+
+def compare(current, baseline, threshold=0.2, min_seconds=0.05):
+    """
+    Lists stages that got slower than the baseline by more than `threshold`
+    (a fraction) and by at least `min_seconds`, to ignore timer noise, and
+    every case that failed in the current run.
+    """
+    baseline_cases = {(c["pipeline"], c["input"]): c for c in baseline["cases"]}
+    regressions = []
+    for case in current["cases"]:
+        if "error" in case:
+            regressions.append({"pipeline": case["pipeline"], "input": case["input"], "error": case["error"]})
+            continue
+        old = baseline_cases.get((case["pipeline"], case["input"]))
+        if old is None:
+            continue
+        for name, stage in case["stages"].items():
+            if name not in old["stages"]:
+                continue
+            before = old["stages"][name]["seconds"]
+            after = stage["seconds"]
+            if after - before >= min_seconds and after > before * (1 + threshold):
+                regressions.append({
+                    "pipeline": case["pipeline"],
+                    "input": case["input"],
+                    "stage": name,
+                    "baseline_seconds": before,
+                    "seconds": after,
+                    "change": after / before - 1 if before else float("inf")
+                })
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the table detection pipelines stage by stage.")
+    parser.add_argument("--files-dir", default="files")
+    parser.add_argument("--sizes", type=int, nargs="*", default=list(DEFAULT_SIZES),
+                        help="Filled-cell counts of the synthetic sheets")
+    parser.add_argument("--layouts", nargs="*", default=list(LAYOUTS), choices=LAYOUTS)
+    parser.add_argument("--pipelines", nargs="+", default=list(PIPELINES), choices=list(PIPELINES))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced peak-memory run")
+    parser.add_argument("--output", default=f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown, e.g. 0.2 for 20%%")
+    args = parser.parse_args()
+
+    paths = collect_inputs(args.files_dir, args.sizes, args.layouts)
+    results = run_benchmarks(paths, args.pipelines, args.repeat, not args.no_memory)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+    print(f"Saved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for r in regressions:
+            if "error" in r:
+                print(f"REGRESSION {r['pipeline']} / {r['input']} failed: {r['error']}")
+                continue
+            print(f"REGRESSION {r['pipeline']} / {r['input']} / {r['stage']}: "
+                  f"{r['baseline_seconds']:.3f}s -> {r['seconds']:.3f}s ({r['change']:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("No regressions.")
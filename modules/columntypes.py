@@ -0,0 +1,134 @@
+import json
+import numpy as np
+import pandas as pd
+
+BOOLEAN_VALUES = {"true": True, "false": False}
+# A string column becomes categorical when it has at least this many values and
+# at most this share of distinct ones
+CATEGORY_MIN_VALUES = 10
+CATEGORY_MAX_RATIO = 0.5
+# Values like "007" or "0123" are codes and phone numbers, not numbers
+LEADING_ZERO = r"[+-]?0\d"
+# Longer integers lose digits in float64 and are kept as text
+INTEGER = r"-?\d{1,15}"
+# Plain decimals only: "+48...", "1E5" or ".5" are kept as text
+DECIMAL = r"-?\d+(?:\.\d+)?"
+# Dates must look like dates, so plain numbers are never read as timestamps
+DATE_LIKE = r"\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}.*"
+
+PANDAS_DTYPES = {
+    "integer": "Int64",
+    "float": "float64",
+    "boolean": "boolean",
+    "date": "datetime64[ns]",
+    "category": "category",
+    "string": "object",
+}
+
+
+def infer_column(values):
+    """
+    Infers the type of one column of stripped strings (None for blanks).
+    Every non-blank value has to convert, otherwise the column stays text;
+    numbers also have to read back as the exact text they came from, so
+    "+2348012345678", "1E5" or "3.10" stay strings.
+    :return: (typed Series, type name from PANDAS_DTYPES)
+    """
+    present = values.dropna()
+    if present.empty:
+        return values.astype(object), "string"
+    text = present.astype(str)
+
+    lowered = text.str.lower()
+    if lowered.isin(list(BOOLEAN_VALUES)).all():
+        typed = pd.Series(pd.NA, index=values.index, dtype="boolean")
+        typed[present.index] = lowered.map(BOOLEAN_VALUES).astype(bool)
+        return typed, "boolean"
+
+    if not text.str.match(LEADING_ZERO).any():
+        if text.str.fullmatch(INTEGER).all():
+            integers = pd.to_numeric(text).astype("int64")
+            if (integers.astype(str) == text).all():
+                typed = pd.Series(pd.NA, index=values.index, dtype="Int64")
+                typed[present.index] = integers
+                return typed, "integer"
+        elif text.str.fullmatch(DECIMAL).all():
+            numbers = pd.to_numeric(text).astype("float64")
+            if (_number_text(numbers, text.str.contains(".", regex=False)) == text).all():
+                return pd.to_numeric(values, errors="coerce").astype("float64"), "float"
+
+    if text.str.fullmatch(DATE_LIKE).all():
+        dates = pd.to_datetime(text, format="ISO8601", errors="coerce")
+        if dates.notna().all():
+            typed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+            typed[present.index] = dates.astype("datetime64[ns]")
+            return typed, "date"
+
+    if len(present) >= CATEGORY_MIN_VALUES and text.nunique() <= CATEGORY_MAX_RATIO * len(present):
+        return values.astype("category"), "category"
+
+    return values, "string"
+
+
+def _number_text(numbers, decimal):
+    """Shortest text of each float: repr() where the source had a decimal point, the integer otherwise."""
+    return pd.Series(
+        [repr(x) if d else str(int(x)) for x, d in zip(numbers.tolist(), decimal.tolist())],
+        index=numbers.index
+    )
+
+
+def infer_column_types(data_df):
+    """
+    Converts a table of strings to typed columns.
+    :return: (typed DataFrame, {column: type name})
+    """
+    typed = {}
+    column_types = {}
+    for j, column in enumerate(data_df.columns):
+        typed[j], column_types[str(column)] = infer_column(data_df.iloc[:, j])
+    typed_df = pd.DataFrame(typed, index=data_df.index)
+    typed_df.columns = data_df.columns
+    return typed_df, column_types
+
+
+def json_records(typed_df):
+    """
+    Row dicts of a typed table with JSON-native values: numbers and booleans
+    stay numbers and booleans, dates become ISO 8601 strings, blanks None.
+    """
+    keys = [str(column) for column in typed_df.columns]
+    columns = []
+    for j in range(typed_df.shape[1]):
+        column = typed_df.iloc[:, j]
+        missing = column.isna().to_numpy()
+        if pd.api.types.is_datetime64_any_dtype(column.dtype):
+            values = np.datetime_as_string(column.to_numpy(), unit="s").astype(object)
+        else:
+            values = column.to_numpy(dtype=object)
+        values[missing] = None
+        columns.append(values.tolist())
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def typed_frame(records, column_types):
+    """Rebuilds a typed DataFrame from the records and column_types of tables.json."""
+    df = pd.DataFrame.from_records(records, columns=list(column_types) or None)
+    for column, type_name in column_types.items():
+        if column not in df.columns:
+            continue
+        if type_name == "date":
+            df[column] = pd.to_datetime(df[column], format="ISO8601")
+        else:
+            df[column] = df[column].astype(PANDAS_DTYPES[type_name])
+    return df
+
+
+def load_typed_tables(json_file_path="tables.json"):
+    """Loads the detected tables of a tables.json artifact as typed DataFrames."""
+    with open(json_file_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {
+        table_name: typed_frame(table_info.get("data", []), table_info.get("column_types", {}))
+        for table_name, table_info in data.get("tables", {}).items()
+    }
@@ -4,6 +4,8 @@ from langchain.prompts import PromptTemplate
 import os
 import pandas as pd
 import json
+from modules.instrumentation import span, enabled, approx_tokens
+from modules.valueindex import lookup_tables_csv
 
 class CSVPromptQA:
     def __init__(self, json_file_path, model_path: str):
@@ -41,6 +43,12 @@ class CSVPromptQA:
 
         csv_outputs = {}
         for table_name, records in data["tables"].items():
+            # detect_tables stores each table as {"headers": ..., "data": [rows]}
+            if isinstance(records, dict):
+                records = records.get("data", [])
+            if not records:
+                continue
+
             # Convert list of dicts to DataFrame
             df = pd.DataFrame(records)
 
@@ -72,5 +80,14 @@ class CSVPromptQA:
         return all_csv_data
 
     def ask(self, question: str) -> str:
-        all_csv_data = "\n\n".join(f"{k}:\n{v}" for k, v in self.csv_tables.items())
-        return self.chain.run(tables_csv=all_csv_data, question=question)
+        # Lookup questions only need the matching rows (with their header row)
+        csv_tables = lookup_tables_csv(question, self.json_file_path) or self.csv_tables
+        all_csv_data = "\n\n".join(f"{k}:\n{v}" for k, v in csv_tables.items())
+        with span("csvqa.ask", tables=len(csv_tables)) as stage:
+            answer = self.chain.run(tables_csv=all_csv_data, question=question)
+            if enabled():
+                stage.set(
+                    prompt_tokens=approx_tokens(all_csv_data) + approx_tokens(question),
+                    answer_tokens=approx_tokens(answer)
+                )
+        return answer
@@ -1,34 +1,67 @@
-import pandas as pd
 import numpy as np
 from sklearn.cluster import DBSCAN
-import os
-import json
-from modules.parameters import find_optimal_eps
+from modules.parameters import suggest_eps
+from modules.sheetreader import read_sheet, occupied_cells
+from modules.tiledclustering import stream_occupied_cells, tiled_dbscan
+from modules.shapeclassifier import grid_labels
+from modules.instrumentation import span, traced
 
-def detect_tables_bbox(file_path, sheet_name=None):
-    df = pd.read_excel(file_path, sheet_name=sheet_name, header=None, dtype=str)
-    df_original = df.copy()
-    df = df.dropna(axis=1, how="all")
 
-    data = df_original.replace("", np.nan).values
-    cell_indices = np.argwhere(pd.notnull(data))
+def cluster_cells(cell_indices, eps, min_samples=2):
+    """
+    Runs DBSCAN over cell coordinates and returns the label array. Sheets made
+    of separate solid blocks (one dense table, tables side by side, ...) are
+    labeled from the occupancy grid without a neighbor search.
+    """
+    with span("shape_classifier") as stage:
+        labels = grid_labels(cell_indices, eps, min_samples)
+        stage.set(fast_path=int(labels is not None))
+    if labels is None:
+        labels = DBSCAN(eps=eps, min_samples=min_samples).fit(cell_indices).labels_
+    return labels
 
-    bboxes = []
 
-    if len(cell_indices) > 0:
-        optimal_eps = find_optimal_eps(cell_indices)
-        clustering = DBSCAN(eps=optimal_eps, min_samples=2).fit(cell_indices)
-        labels = clustering.labels_
+def table_boxes(cell_indices, labels):
+    """
+    Computes the bounding box of every cluster, ordered by label.
+    :return: (n, 4) int array of [top_row, bottom_row, left_col, right_col].
+    """
+    boxes = []
+    for label in sorted(set(labels) - {-1}):
+        table_cells = cell_indices[labels == label]
+        rows = table_cells[:, 0]
+        cols = table_cells[:, 1]
+        boxes.append((rows.min(), rows.max(), cols.min(), cols.max()))
+    return np.array(boxes, dtype=np.int64).reshape(-1, 4)
+
 
-        unique_labels = sorted(set(labels) - {-1})
-        for i, label in enumerate(unique_labels, start=1):
-            table_cells = cell_indices[labels == label]
-            rows = table_cells[:, 0]
-            cols = table_cells[:, 1]
+@traced("detect_tables_bbox")
+def detect_tables_bbox(file_path, sheet_name=None, eps=None, min_samples=2, band_rows=None, workers=1):
+    """
+    Detects table bounding boxes in one worksheet.
+    :param eps: DBSCAN radius. None picks it with the k-distance heuristic.
+    :param min_samples: DBSCAN core point threshold.
+    :param band_rows: Out-of-core mode for very large sheets. When set, the sheet
+        is streamed without building a DataFrame and clustered in row bands of
+        this height (see modules.tiledclustering); the boxes are the same.
+    :param workers: Processes used for the bands in out-of-core mode.
+    """
+    if band_rows:
+        cell_indices = stream_occupied_cells(file_path, sheet_name)
+    else:
+        cell_indices = occupied_cells(read_sheet(file_path, sheet_name))
 
-            min_row, max_row = rows.min(), rows.max()
-            min_col, max_col = cols.min(), cols.max()
+    bboxes = []
+
+    if len(cell_indices) > 0:
+        if eps is None:
+            eps, _ = suggest_eps(cell_indices)
+        if band_rows:
+            labels = tiled_dbscan(cell_indices, eps, min_samples, band_rows, workers)
+        else:
+            labels = cluster_cells(cell_indices, eps, min_samples)
 
+        for i, (min_row, max_row, min_col, max_col) in enumerate(table_boxes(cell_indices, labels), start=1):
             bbox = {
                 "table_id": f"table_{i}",
                 "bounding_box": {
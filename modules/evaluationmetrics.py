@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+BOX_KEYS = ("top_row", "bottom_row", "left_col", "right_col")
+DEFAULT_THRESHOLDS = (0.5, 0.75, 0.9)
+
+
+def boxes_to_array(tables):
+    """
+    Converts a list of {"bounding_box": {...}} entries (the format written by
+    evaluationwrapper.py) into an (n, 4) array of [top, bottom, left, right].
+    """
+    return np.array(
+        [[table["bounding_box"][key] for key in BOX_KEYS] for table in tables],
+        dtype=np.int64
+    ).reshape(-1, 4)
+
+
+def _spreadsheet_name(file_name, data):
+    if "spreadsheet" in data:
+        return data["spreadsheet"]
+    for suffix in ("_pred.json", "_gt.json", ".json"):
+        if file_name.endswith(suffix):
+            return file_name[:-len(suffix)]
+    return file_name
+
+
+def load_boxes(directory):
+    """
+    Loads every bounding-box JSON file in a directory.
+    :param directory: Folder of files shaped like predictions/*_pred.json.
+    :return: ({spreadsheet: (n, 4) box array}, {spreadsheet: detection seconds or None})
+    """
+    boxes = {}
+    timings = {}
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(".json"):
+            continue
+        with open(os.path.join(directory, file_name), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        name = _spreadsheet_name(file_name, data)
+        boxes[name] = boxes_to_array(data.get("tables", []))
+        timings[name] = data.get("elapsed_seconds")
+    return boxes, timings
+
+
+def iou_matrix(gt, pred):
+    """
+    Computes the IoU of every ground-truth box against every predicted box.
+    Boxes are inclusive cell ranges, so a 1x1 box covers one cell.
+    :param gt: (n, 4) array of [top, bottom, left, right].
+    :param pred: (m, 4) array of [top, bottom, left, right].
+    :return: (n, m) float array.
+    """
+    top = np.maximum(gt[:, None, 0], pred[None, :, 0])
+    bottom = np.minimum(gt[:, None, 1], pred[None, :, 1])
+    left = np.maximum(gt[:, None, 2], pred[None, :, 2])
+    right = np.minimum(gt[:, None, 3], pred[None, :, 3])
+    intersection = np.clip(bottom - top + 1, 0, None) * np.clip(right - left + 1, 0, None)
+
+    gt_area = (gt[:, 1] - gt[:, 0] + 1) * (gt[:, 3] - gt[:, 2] + 1)
+    pred_area = (pred[:, 1] - pred[:, 0] + 1) * (pred[:, 3] - pred[:, 2] + 1)
+    union = gt_area[:, None] + pred_area[None, :] - intersection
+    return intersection / np.maximum(union, 1)
+
+
+def match_boxes(iou, thresholds):
+    """
+    Counts true positives at each IoU threshold using an optimal one-to-one
+    assignment between ground-truth and predicted boxes.
+    :return: List of true-positive counts, one per threshold.
+    """
+    true_positives = []
+    for threshold in thresholds:
+        valid = iou >= threshold
+        if not valid.any():
+            true_positives.append(0)
+            continue
+        if (valid.sum(axis=0) <= 1).all() and (valid.sum(axis=1) <= 1).all():
+            # Every candidate pair is unambiguous, no assignment needed
+            true_positives.append(int(valid.sum()))
+            continue
+        rows, cols = linear_sum_assignment(valid, maximize=True)
+        true_positives.append(int(valid[rows, cols].sum()))
+    return true_positives
+
+
+def _scores(tp, fp, fn):
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"tp": tp, "fp": fp, "fn": fn, "precision": precision, "recall": recall, "f1": f1}
+
+
+def evaluate(gt_boxes, pred_boxes, thresholds=DEFAULT_THRESHOLDS, detection_timings=None):
+    """
+    Scores predicted table boxes against ground truth over a whole corpus.
+    :param gt_boxes: {spreadsheet: (n, 4) array} ground truth.
+    :param pred_boxes: {spreadsheet: (m, 4) array} predictions. Spreadsheets
+        without a prediction count every ground-truth box as a miss.
+    :param thresholds: IoU thresholds to report.
+    :param detection_timings: Optional {spreadsheet: seconds} from the detector.
+    :return: Report dict with micro-averaged scores per threshold and per-file rows.
+    """
+    thresholds = tuple(float(t) for t in thresholds)
+    detection_timings = detection_timings or {}
+    totals = np.zeros((len(thresholds), 3), dtype=np.int64)  # tp, fp, fn
+    files = []
+    empty = np.zeros((0, 4), dtype=np.int64)
+
+    for name, gt in gt_boxes.items():
+        start = time.perf_counter()
+        pred = pred_boxes.get(name, empty)
+        iou = iou_matrix(gt, pred)
+        tp = np.array(match_boxes(iou, thresholds), dtype=np.int64)
+        fp = len(pred) - tp
+        fn = len(gt) - tp
+        totals += np.stack([tp, fp, fn], axis=1)
+        best_iou = iou.max(axis=1) if iou.shape[1] else np.zeros(len(gt))
+        elapsed = time.perf_counter() - start
+
+        files.append({
+            "spreadsheet": name,
+            "n_gt": int(len(gt)),
+            "n_pred": int(len(pred)),
+            "has_prediction": name in pred_boxes,
+            "best_iou": [float(v) for v in best_iou],
+            "tp": {str(t): int(v) for t, v in zip(thresholds, tp)},
+            "scoring_seconds": elapsed,
+            "detection_seconds": detection_timings.get(name)
+        })
+
+    detection_seconds = [f["detection_seconds"] for f in files if f["detection_seconds"] is not None]
+    return {
+        "thresholds": {
+            str(t): _scores(*(int(v) for v in totals[k])) for k, t in enumerate(thresholds)
+        },
+        "n_files": len(files),
+        "missing_predictions": [f["spreadsheet"] for f in files if not f["has_prediction"]],
+        "unmatched_predictions": sorted(set(pred_boxes) - set(gt_boxes)),
+        "scoring_seconds": float(sum(f["scoring_seconds"] for f in files)),
+        "detection_seconds": float(sum(detection_seconds)) if detection_seconds else None,
+        "files": files
+    }
+
+
+def evaluate_directories(gt_dir, pred_dir, thresholds=DEFAULT_THRESHOLDS):
+    """Loads ground truth and predictions from disk and scores them."""
+    gt_boxes, _ = load_boxes(gt_dir)
+    pred_boxes, detection_timings = load_boxes(pred_dir)
+    return evaluate(gt_boxes, pred_boxes, thresholds, detection_timings)
+
+
+def print_report(report):
+    print(f"Files: {report['n_files']}  (missing predictions: {len(report['missing_predictions'])})")
+    print(f"{'IoU':>6} {'TP':>7} {'FP':>7} {'FN':>7} {'Prec':>7} {'Recall':>7} {'F1':>7}")
+    for threshold, s in report["thresholds"].items():
+        print(f"{float(threshold):>6.2f} {s['tp']:>7} {s['fp']:>7} {s['fn']:>7} "
+              f"{s['precision']:>7.3f} {s['recall']:>7.3f} {s['f1']:>7.3f}")
+    print(f"Scoring time: {report['scoring_seconds']:.3f}s")
+    if report["detection_seconds"] is not None:
+        print(f"Detection time: {report['detection_seconds']:.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score predicted table boxes against ground truth.")
+    parser.add_argument("gt_dir", help="Folder of ground-truth box JSON files")
+    parser.add_argument("pred_dir", nargs="?", default="predictions", help="Folder of *_pred.json files")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=list(DEFAULT_THRESHOLDS))
+    parser.add_argument("--output", help="Optional path for the full JSON report")
+    args = parser.parse_args()
+
+    report = evaluate_directories(args.gt_dir, args.pred_dir, args.thresholds)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
@@ -0,0 +1,65 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class FileCache:
+    """
+    Values loaded from files (parsed JSON, CSV tables, prompt contexts, ...),
+    loaded again only when a file's modification time changes.
+
+    Keeps the `max_entries` most recently used files of those still on disk.
+    Replaced and dropped values are passed to `on_evict`, e.g. to release
+    provider-side resources. Concurrent callers asking for the same file wait
+    for one load instead of each loading it.
+    """
+
+    def __init__(self, loader, max_entries, on_evict=None):
+        self.loader = loader
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        self._entries = OrderedDict()  # { path: (mtime, value) }
+        self._loading = {}  # { path: Lock held while the path loads }
+        self._lock = threading.Lock()
+
+    def _hit(self, path, mtime):
+        cached = self._entries.get(path)
+        if cached is None or cached[0] != mtime:
+            return None
+        self._entries.move_to_end(path)
+        return cached
+
+    def get(self, path):
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._hit(path, mtime)
+            if cached is not None:
+                return cached[1]
+            path_lock = self._loading.setdefault(path, threading.Lock())
+
+        with path_lock:
+            with self._lock:
+                cached = self._hit(path, mtime)
+            if cached is not None:
+                return cached[1]
+            value = self.loader(path)
+            dropped = []
+            with self._lock:
+                if path in self._entries:
+                    dropped.append(self._entries.pop(path)[1])
+                self._entries[path] = (mtime, value)
+                for stale in [p for p in self._entries if not os.path.exists(p)]:
+                    dropped.append(self._entries.pop(stale)[1])
+                while len(self._entries) > self.max_entries:
+                    dropped.append(self._entries.popitem(last=False)[1][1])
+                for idle in [p for p, lock in self._loading.items() if p not in self._entries and not lock.locked()]:
+                    del self._loading[idle]
+
+        if self.on_evict is not None:
+            for old in dropped:
+                self.on_evict(old)
+        return value
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -1,35 +1,267 @@
 # modules.geminis.py
 import base64
 import os
+import re
+import threading
+from concurrent.futures import Future
 from google import genai
 from google.genai import types
-from modules.prompt import generate_prompt
+from modules.filecache import FileCache
+from modules.prompt import generate_prompt, context_prefix, question_suffix, batch_suffix
+from modules.valueindex import lookup_tables_csv
+from modules.instrumentation import span, enabled, approx_tokens
 
-def generate(question):
-    client = genai.Client(
-        api_key=os.environ.get("GEMINI_API_KEY"),
-    )
+MODEL = "gemini-2.5-flash-preview-05-20"
+CONTEXT_TTL_SECONDS = 3600
+# Questions arriving within this window about the same sheet share one request
+BATCH_WINDOW_SECONDS = 0.5
+MAX_BATCH_QUESTIONS = 8
+# Sheet contexts kept in memory, least recently used dropped first
+MAX_CONTEXTS = 32
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = genai.Client(
+            api_key=os.environ.get("GEMINI_API_KEY"),
+        )
+    return _client
 
-    model = "gemini-2.5-flash-preview-05-20"
+
+def generate(question, json_file_path=None, matching_rows=None):
+    with span("gemini.generate") as stage:
+        response_text, usage = _generate(question, json_file_path, matching_rows)
+        if enabled():
+            stage.set(
+                prompt_tokens=usage.get("prompt_tokens"),
+                response_tokens=usage.get("response_tokens"),
+                response_chars=len(response_text)
+            )
+    return response_text
+
+def _generate(question, json_file_path=None, matching_rows=None):
+    prompt = generate_prompt(question=question, json_file_path=json_file_path, matching_rows=matching_rows)
     contents = [
         types.Content(
             role="user",
             parts=[
-                types.Part.from_text(text=generate_prompt(question=question)),
+                types.Part.from_text(text=prompt),
             ],
         ),
     ]
+    return _stream(contents, prompt)
+
+def _stream(contents, prompt, cached_content=None):
     generate_content_config = types.GenerateContentConfig(
         response_mime_type="text/plain",
+        cached_content=cached_content,
     )
 
     # Collect all chunks from the stream
     response_text = ""
-    for chunk in client.models.generate_content_stream(
-        model=model,
+    usage_metadata = None
+    for chunk in get_client().models.generate_content_stream(
+        model=MODEL,
         contents=contents,
         config=generate_content_config,
     ):
-        response_text += chunk.text
+        response_text += chunk.text or ""
+        usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+
+    # Prefer the provider's token counts, fall back to an estimate
+    usage = {
+        "prompt_tokens": getattr(usage_metadata, "prompt_token_count", None) or approx_tokens(prompt),
+        "cached_tokens": getattr(usage_metadata, "cached_content_token_count", None) or 0,
+        "response_tokens": getattr(usage_metadata, "candidates_token_count", None) or approx_tokens(response_text)
+    }
+    return response_text, usage
+
+
+def split_answers(text, count):
+    """Splits a batched response into its "Answer n:" sections; None where one is missing."""
+    answers = [None] * count
+    parts = re.split(r"^\s*Answer\s+(\d+)\s*:\s*", text, flags=re.MULTILINE)
+    for number, answer in zip(parts[1::2], parts[2::2]):
+        index = int(number) - 1
+        if 0 <= index < count and answers[index] is None:
+            answers[index] = answer.strip()
+    return answers
+
+
+class SheetContext:
+    """
+    The prompt prefix of one detection output (all tables as CSV plus the
+    instructions), serialized once and reused for every question about it.
+
+    When the provider supports explicit context caching the prefix is uploaded
+    once with client.caches.create and each question only sends its own text.
+    Otherwise (caching unavailable, prefix under the model's minimum size, ...)
+    the stored prefix is sent verbatim in front of each question, which keeps
+    it byte-identical and eligible for the provider's implicit prefix caching.
+    """
+
+    def __init__(self, json_file_path="tables.json", ttl_seconds=CONTEXT_TTL_SECONDS,
+                 batch_window=BATCH_WINDOW_SECONDS):
+        self.json_file_path = json_file_path
+        self.ttl_seconds = ttl_seconds
+        self.batch_window = batch_window
+        self.prefix = context_prefix(json_file_path)
+        self.cache_name = None
+        self._cache_tried = False
+        self._cache_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._pending = []  # [(question, Future)]
+        self._flush_timer = None
+        self._in_flight = 0
+
+    @property
+    def mode(self):
+        return "provider" if self.cache_name else "local"
+
+    def _ensure_cache(self):
+        with self._cache_lock:
+            if not self._cache_tried:
+                self._cache_tried = True
+                self._create_cache()
+        return self.cache_name
+
+    def _create_cache(self):
+        caches = getattr(get_client(), "caches", None)
+        if caches is None:
+            return
+        try:
+            with span("gemini.cache_create", prefix_tokens=approx_tokens(self.prefix)):
+                cache = caches.create(
+                    model=MODEL,
+                    config=types.CreateCachedContentConfig(
+                        display_name=f"sheetqa {os.path.basename(self.json_file_path)}",
+                        contents=[types.Content(role="user", parts=[types.Part.from_text(text=self.prefix)])],
+                        ttl=f"{self.ttl_seconds}s",
+                    ),
+                )
+            self.cache_name = cache.name
+        except Exception as e:
+            print(f"Context caching unavailable, sending the prefix inline: {e}")
+
+    def _send(self, suffix, questions):
+        with span("gemini.session_generate", questions=questions) as stage:
+            cache_name = self._ensure_cache()
+            if cache_name:
+                prompt = suffix
+                contents = [types.Content(role="user", parts=[types.Part.from_text(text=suffix)])]
+            else:
+                prompt = self.prefix + suffix
+                contents = [types.Content(role="user", parts=[
+                    types.Part.from_text(text=self.prefix), types.Part.from_text(text=suffix)
+                ])]
+            try:
+                response_text, usage = _stream(contents, prompt, cache_name)
+            except Exception:
+                if not cache_name:
+                    raise
+                # The cached context expired or was deleted: fall back to inline
+                self.cache_name = None
+                contents = [types.Content(role="user", parts=[
+                    types.Part.from_text(text=self.prefix), types.Part.from_text(text=suffix)
+                ])]
+                response_text, usage = _stream(contents, self.prefix + suffix)
+            if enabled():
+                stage.set(
+                    prompt_tokens=usage["prompt_tokens"],
+                    cached_tokens=usage["cached_tokens"],
+                    response_tokens=usage["response_tokens"],
+                    provider_cache=int(bool(self.cache_name))
+                )
+        return response_text
+
+    def ask(self, question):
+        """Answers one question against the shared prefix."""
+        return self._send(question_suffix(question), 1)
+
+    def ask_many(self, questions):
+        """Answers several questions in one request, asking again for any it skipped."""
+        if len(questions) == 1:
+            return [self.ask(questions[0])]
+        answers = split_answers(self._send(batch_suffix(questions), len(questions)), len(questions))
+        return [answer if answer is not None else self.ask(q) for q, answer in zip(questions, answers)]
+
+    def submit(self, question):
+        """
+        Queues a question; questions submitted within batch_window of each other
+        are sent together through ask_many(). A question arriving while nothing
+        else is pending or being answered is sent right away.
+        :return: Future with the answer.
+        """
+        future = Future()
+        with self._lock:
+            self._pending.append((question, future))
+            if len(self._pending) >= MAX_BATCH_QUESTIONS or (len(self._pending) == 1 and not self._in_flight):
+                self._flush_locked()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.batch_window, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        return future
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._in_flight += 1
+            threading.Thread(target=self._answer_batch, args=(batch,), daemon=True).start()
+
+    def _answer_batch(self, batch):
+        questions = [question for question, _ in batch]
+        try:
+            answers = self.ask_many(questions)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        for (_, future), answer in zip(batch, answers):
+            future.set_result(answer)
+
+    def close(self):
+        """Deletes the provider-side cache, if one was created."""
+        if self.cache_name:
+            try:
+                get_client().caches.delete(name=self.cache_name)
+            except Exception:
+                pass
+            self.cache_name = None
+
+
+_contexts = FileCache(SheetContext, MAX_CONTEXTS, on_evict=SheetContext.close)
+
+
+def get_context(json_file_path="tables.json"):
+    """
+    The shared SheetContext of a detection output, rebuilt when the file changes.
+    At most MAX_CONTEXTS are kept; contexts of deleted files (evicted uploads)
+    and the least recently used ones are closed.
+    """
+    return _contexts.get(json_file_path)
+
 
-    return response_text
\ No newline at end of file
+def generate_in_session(question, json_file_path="tables.json"):
+    """
+    Answers a question about a sheet through its SheetContext: lookup questions
+    get a small prompt with just the matching rows, everything else reuses the
+    sheet's cached prefix and is batched with concurrent questions.
+    """
+    matching_rows = lookup_tables_csv(question, json_file_path)
+    if matching_rows:
+        return generate(question, json_file_path, matching_rows)
+    return get_context(json_file_path).submit(question).result()
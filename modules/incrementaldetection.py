@@ -0,0 +1,269 @@
+import os
+import math
+import pickle
+import hashlib
+import numpy as np
+from sklearn.cluster import DBSCAN
+from modules.sheetreader import read_sheet, occupied_cells
+from modules.sheetprocessor import (
+    build_table, cluster_bounds, noise_comments, halo_comments, merge_comments,
+    tables_to_json, write_tables_json, visualize_tables, COMMENT_PROXIMITY
+)
+from modules.shapeclassifier import grid_labels
+from modules.instrumentation import span
+
+STATE_DIR = os.path.join(".cache", "detections")
+# Same clustering parameters as sheetprocessor.detect_tables
+EPS = 1.4
+MIN_SAMPLES = 2
+# Above this share of changed cells a full run is cheaper than patching
+FULL_RUN_RATIO = 0.5
+
+
+def state_path(state_key, state_dir=STATE_DIR):
+    """Where the detection state of a workbook is pickled."""
+    key = hashlib.sha1(state_key.encode("utf-8")).hexdigest()
+    return os.path.join(state_dir, f"{key}.pkl")
+
+
+def load_state(state_key, state_dir=STATE_DIR):
+    path = state_path(state_key, state_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def save_state(state_key, state, state_dir=STATE_DIR):
+    os.makedirs(state_dir, exist_ok=True)
+    with open(state_path(state_key, state_dir), "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def render_state(state_key, image_path, state_dir=STATE_DIR):
+    """
+    Draws the detection image of a saved state, without reading the sheet or
+    detecting its tables again.
+    :return: The image path, or None if there is no state or the sheet is empty.
+    """
+    state = load_state(state_key, state_dir)
+    if state is None or len(state["cell_indices"]) == 0:
+        return None
+    comments = [state["noise"][key] for key in sorted(state["noise"]) if state["noise"][key] is not None]
+    comments = merge_comments(comments, [state["halo"][bounds] for bounds in state["tables"]])
+    tables = {f"table {i}": info for i, info in enumerate(state["tables"].values(), start=1)}
+    visualize_tables(state["cell_indices"], state["labels"], tables, comments, image_path)
+    return image_path
+
+
+def _keys(coords, width):
+    return coords[:, 0].astype(np.int64) * width + coords[:, 1]
+
+
+def _near(cell_keys, centers, radius, width):
+    """Marks cells within `radius` rows and columns of any center coordinate."""
+    if len(centers) == 0:
+        return np.zeros(len(cell_keys), dtype=bool)
+    offsets = np.arange(-radius, radius + 1)
+    dr, dc = np.meshgrid(offsets, offsets, indexing="ij")
+    window = (dr * width + dc).ravel()
+    dilated = np.unique((_keys(centers, width)[:, None] + window[None, :]).ravel())
+    return np.isin(cell_keys, dilated)
+
+
+def _dbscan(cell_indices):
+    labels = grid_labels(cell_indices, EPS, MIN_SAMPLES)
+    if labels is not None:
+        # Clusters are side-by-side groups of 2+ cells, so every member is core
+        return labels, labels >= 0 if MIN_SAMPLES > 1 else np.ones(len(labels), dtype=bool)
+    clustering = DBSCAN(eps=EPS, min_samples=MIN_SAMPLES).fit(cell_indices)
+    core = np.zeros(len(cell_indices), dtype=bool)
+    core[clustering.core_sample_indices_] = True
+    return clustering.labels_, core
+
+
+def _renumber(labels, core):
+    """Numbers clusters by their lowest-index core cell, as sklearn's DBSCAN does."""
+    clustered = core & (labels >= 0)
+    ids, first_core = np.unique(labels[clustered], return_index=True)
+    lookup = np.full(int(labels.max()) + 2 if len(labels) else 1, -1, dtype=np.int64)
+    lookup[ids[np.argsort(first_core)]] = np.arange(len(ids))
+    return np.where(labels >= 0, lookup[labels], -1)
+
+
+def recluster(cell_indices, prev_labels, prev_core, changed, width):
+    """
+    Updates DBSCAN labels after an edit by re-clustering only the clusters near
+    changed cells, plus the cells around them.
+    :param cell_indices: Row-major coordinates of the new sheet.
+    :param prev_labels: Previous label per new cell, -2 for cells that are new.
+    :param prev_core: Previous core flag per new cell.
+    :param changed: Coordinates that were added or removed.
+    :return: (labels, core flags, number of re-clustered cells)
+    """
+    radius = int(math.floor(EPS))
+    cell_keys = _keys(cell_indices, width)
+    near_change = _near(cell_keys, changed, radius, width)
+    dirty = set(prev_labels[near_change].tolist()) - {-1, -2}
+    region = near_change | np.isin(prev_labels, list(dirty))
+    if not region.any():
+        # Only isolated cells were removed
+        return _renumber(prev_labels, prev_core), prev_core, 0
+
+    while True:
+        # Context cells complete the neighborhoods of the region's cells
+        context = _near(cell_keys, cell_indices[region], radius, width) & ~region
+        local = np.flatnonzero(region | context)
+        local_labels, local_core = _dbscan(cell_indices[local])
+
+        in_region = region[local]
+        touched = set(local_labels[in_region].tolist()) - {-1}
+        joined = np.isin(local_labels, list(touched)) & ~in_region
+        grown = set(prev_labels[local[joined]].tolist()) - {-1, -2} - dirty
+        if not grown:
+            break
+        # A region cluster reaches into a clean cluster: re-cluster that one too
+        dirty |= grown
+        region |= np.isin(prev_labels, list(grown))
+
+    offset = max(int(prev_labels.max()), -1) + 1
+    labels = prev_labels.copy()
+    core = prev_core.copy()
+    region_cells = local[in_region]
+    labels[region_cells] = np.where(local_labels[in_region] >= 0, local_labels[in_region] + offset, -1)
+    core[region_cells] = local_core[in_region]
+    # Former noise cells that became borders of a re-clustered table
+    joined_cells = local[joined]
+    labels[joined_cells] = local_labels[joined] + offset
+
+    return _renumber(labels, core), core, int(region.sum())
+
+
+def _changed_within(changed, bounds, margin=0):
+    if len(changed) == 0:
+        return False
+    min_row, max_row, min_col, max_col = bounds
+    rows, cols = changed[:, 0], changed[:, 1]
+    return bool(np.any(
+        (rows >= min_row - margin) & (rows <= max_row + margin) &
+        (cols >= min_col - margin) & (cols <= max_col + margin)
+    ))
+
+
+def detect_tables_incremental(file_path, visualize=False, json_file_path="tables.json",
+                              image_path="table_detection.png", state_dir=STATE_DIR, state_key=None):
+    """
+    Same result as sheetprocessor.detect_tables, but keeps the occupancy, labels,
+    tables and comment candidates of the previous run of this file. When a
+    re-uploaded workbook differs in a few cells, only the clusters around the
+    edit are re-clustered, and only tables or comment halos whose cells changed
+    are rebuilt.
+    :param state_key: Identifies "the same workbook" across uploads; defaults to
+        the file's absolute path.
+    :return: (number of tables, image path or None)
+    """
+    state_key = state_key or os.path.abspath(file_path)
+    with span("detect_tables_incremental", file=os.path.basename(file_path)) as root:
+        df_original = read_sheet(file_path)
+        cell_indices = occupied_cells(df_original)
+        values = df_original.values[cell_indices[:, 0], cell_indices[:, 1]]
+        previous = load_state(state_key, state_dir)
+
+        width = int(max(
+            cell_indices[:, 1].max() if len(cell_indices) else 0,
+            previous["cell_indices"][:, 1].max() if previous and len(previous["cell_indices"]) else 0
+        )) + 2 * int(math.floor(EPS)) + 2
+        new_keys = _keys(cell_indices, width)
+
+        occupancy_changed = content_changed = np.zeros((0, 2), dtype=np.int64)
+        if previous is not None and len(previous["cell_indices"]):
+            old_keys = _keys(previous["cell_indices"], width)
+            position = np.clip(np.searchsorted(old_keys, new_keys), 0, len(old_keys) - 1)
+            existed = old_keys[position] == new_keys
+            added = cell_indices[~existed]
+            removed = previous["cell_indices"][~np.isin(old_keys, new_keys)]
+            edited = cell_indices[existed][previous["values"][position[existed]] != values[existed]]
+            occupancy_changed = np.concatenate([added, removed]).reshape(-1, 2)
+            content_changed = np.concatenate([occupancy_changed, edited]).reshape(-1, 2)
+        else:
+            previous = None
+
+        if len(cell_indices) == 0:
+            save_state(state_key, {"cell_indices": cell_indices, "values": values, "labels": np.zeros(0, dtype=np.int64),
+                                   "core": np.zeros(0, dtype=bool), "tables": {}, "halo": {}, "noise": {}}, state_dir)
+            return 0, None
+
+        with span("clustering", cells=len(cell_indices)) as stage:
+            if previous is None or len(occupancy_changed) > FULL_RUN_RATIO * len(cell_indices):
+                labels, core = _dbscan(cell_indices)
+                reclustered = len(cell_indices)
+            elif len(occupancy_changed) == 0:
+                labels = previous["labels"][position]
+                core = previous["core"][position]
+                reclustered = 0
+            else:
+                prev_labels = np.where(existed, previous["labels"][position], -2)
+                prev_core = np.where(existed, previous["core"][position], False)
+                labels, core, reclustered = recluster(cell_indices, prev_labels, prev_core, occupancy_changed, width)
+            stage.set(reclustered=reclustered)
+
+        table_bounds = [tuple(int(v) for v in b) for b in cluster_bounds(cell_indices, labels)]
+        old_tables = previous["tables"] if previous else {}
+        old_halo = previous["halo"] if previous else {}
+        old_noise = previous["noise"] if previous else {}
+
+        with span("header_detection") as stage:
+            tables = {}
+            reused = 0
+            for i, bounds in enumerate(table_bounds, start=1):
+                if bounds in old_tables and not _changed_within(content_changed, bounds):
+                    tables[f"table {i}"] = old_tables[bounds]
+                    reused += 1
+                else:
+                    tables[f"table {i}"] = build_table(df_original, bounds)
+            stage.set(tables=len(tables), reused_tables=reused)
+
+        with span("comment_detection"):
+            halo = {}
+            for bounds in table_bounds:
+                if bounds in old_halo and not _changed_within(content_changed, bounds, COMMENT_PROXIMITY):
+                    halo[bounds] = old_halo[bounds]
+                else:
+                    halo[bounds] = halo_comments(bounds, df_original)
+
+            noise = {}
+            rescore = []
+            prev_noise = set(old_noise)
+            changed_cells = set(map(tuple, content_changed.tolist()))
+            for (i, j) in cell_indices[labels == -1].tolist():
+                if (i, j) in prev_noise and (i, j) not in changed_cells:
+                    noise[(i, j)] = old_noise[(i, j)]
+                else:
+                    rescore.append((i, j))
+            for (i, j) in rescore:
+                noise[(i, j)] = None
+            for comment in noise_comments(np.array(rescore, dtype=np.int64).reshape(-1, 2), df_original):
+                noise[(comment["row"], comment["col"])] = comment
+
+            comments = [noise[key] for key in sorted(noise) if noise[key] is not None]
+            comments = merge_comments(comments, [halo[bounds] for bounds in table_bounds])
+
+        if visualize:
+            with span("visualization"):
+                visualize_tables(cell_indices, labels, tables, comments, image_path)
+
+        with span("json_output"):
+            new_table_length = write_tables_json(tables_to_json(tables, comments), json_file_path)
+        root.set(cells=len(cell_indices), tables=new_table_length, reclustered=reclustered, reused_tables=reused)
+
+        save_state(state_key, {
+            "cell_indices": cell_indices,
+            "values": values,
+            "labels": labels,
+            "core": core,
+            "tables": {info["bounds"]: info for info in tables.values()},
+            "halo": halo,
+            "noise": noise
+        }, state_dir)
+
+        return new_table_length, image_path if visualize else None
@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import uuid
+import threading
+import functools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Instrumentation is off until a sink is registered. While it is off, span()
+# hands back one shared no-op object, so instrumented code pays a single
+# list check per call.
+_sinks = []
+_local = threading.local()
+
+
+def enabled():
+    return bool(_sinks)
+
+
+def approx_tokens(text):
+    """Rough token count (about four characters per token) for prompt sizing."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed region of work. Nested spans share the trace id of the outermost one."""
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        parent = stack[-1] if stack else None
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        stack.append(self)
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        _local.stack.pop()
+        record = {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.started_at,
+            "duration_ms": duration * 1000,
+            "attrs": self.attrs,
+            "error": repr(exc) if exc is not None else None
+        }
+        for sink in list(_sinks):
+            sink.emit(record)
+        return False
+
+
+def span(name, **attrs):
+    """
+    Starts a span: `with span("clustering", cells=n) as s: ...; s.set(tables=k)`.
+    Returns a shared no-op when no sink is registered.
+    """
+    if not _sinks:
+        return _NOOP_SPAN
+    return Span(name, attrs)
+
+
+def traced(name):
+    """Decorator that wraps every call of a function in a span."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _sinks:
+                return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class JsonlSink:
+    """Appends one JSON object per finished span to a local file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def emit(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class PrometheusSink:
+    """
+    Aggregates spans into per-stage duration histograms plus counters for every
+    numeric span attribute (cells, tables, prompt_tokens, ...), rendered in the
+    Prometheus text exposition format.
+    """
+
+    BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, prefix="sheetqa"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._attr_totals = {}
+        self._errors = {}
+
+    def emit(self, record):
+        name = record["name"]
+        seconds = record["duration_ms"] / 1000
+        with self._lock:
+            stats = self._durations.setdefault(name, {"count": 0, "sum": 0.0, "buckets": [0] * len(self.BUCKETS)})
+            stats["count"] += 1
+            stats["sum"] += seconds
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    stats["buckets"][i] += 1
+            for key, value in record["attrs"].items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._attr_totals[(name, key)] = self._attr_totals.get((name, key), 0) + value
+            if record["error"] is not None:
+                self._errors[name] = self._errors.get(name, 0) + 1
+
+    def render(self):
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_duration_seconds Wall time of instrumented pipeline stages.",
+            f"# TYPE {p}_stage_duration_seconds histogram"
+        ]
+        with self._lock:
+            for name, stats in sorted(self._durations.items()):
+                for bound, count in zip(self.BUCKETS, stats["buckets"]):
+                    lines.append(f'{p}_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'{p}_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {stats["count"]}')
+                lines.append(f'{p}_stage_duration_seconds_sum{{stage="{name}"}} {stats["sum"]}')
+                lines.append(f'{p}_stage_duration_seconds_count{{stage="{name}"}} {stats["count"]}')
+            lines.append(f"# HELP {p}_stage_attribute_total Sum of numeric span attributes per stage.")
+            lines.append(f"# TYPE {p}_stage_attribute_total counter")
+            for (name, key), total in sorted(self._attr_totals.items()):
+                lines.append(f'{p}_stage_attribute_total{{stage="{name}",attribute="{key}"}} {total}')
+            lines.append(f"# HELP {p}_stage_errors_total Spans that ended with an exception.")
+            lines.append(f"# TYPE {p}_stage_errors_total counter")
+            for name, count in sorted(self._errors.items()):
+                lines.append(f'{p}_stage_errors_total{{stage="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves render() on http://host:port/metrics from a daemon thread."""
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def add_sink(sink):
+    _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def configure_from_env():
+    """
+    Enables instrumentation from environment variables:
+    SHEETQA_TRACE_FILE=path appends spans as JSONL, SHEETQA_METRICS_PORT=port
+    serves Prometheus metrics on /metrics.
+    """
+    trace_file = os.environ.get("SHEETQA_TRACE_FILE")
+    if trace_file:
+        add_sink(JsonlSink(trace_file))
+    metrics_port = os.environ.get("SHEETQA_METRICS_PORT")
+    if metrics_port:
+        add_sink(PrometheusSink()).serve(int(metrics_port))
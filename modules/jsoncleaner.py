@@ -31,11 +31,15 @@ def clean_json_data(json_file_path):
                 for key in keys_to_remove:
                     row.pop(key, None)
         
-        # Preserve headers and cleaned data in the table
+        # Preserve headers, column types and cleaned data in the table
         cleaned_tables[table_name] = {
             "headers": headers,
             "data": cleaned_rows
         }
+        if "column_types" in table_info:
+            cleaned_tables[table_name]["column_types"] = {
+                k: v for k, v in table_info["column_types"].items() if k not in keys_to_remove
+            }
     
     data["tables"] = cleaned_tables
     data["total_tables"] = len(cleaned_tables)
@@ -4,6 +4,7 @@ from langchain_community.vectorstores import FAISS
 from langchain_community.llms import GPT4All
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
+from modules.instrumentation import span, enabled, approx_tokens
 
 class JsonQuestionAnswering:
     def __init__(self, json_file_path, model_path, embedding_model="sentence-transformers/all-MiniLM-L6-v2"):
@@ -41,19 +42,34 @@ class JsonQuestionAnswering:
     def setup_qa_chain(self):
         """Creates the retrieval-based QA chain."""
         retriever = self.vector_store.as_retriever(search_kwargs={"k": 3})  # 👈 limit retrieved context
-        self.qa_chain = RetrievalQA.from_chain_type(llm=self.llm, chain_type="stuff", retriever=retriever)
+        # Retrieved tables are returned too, to size the prompt in traces
+        self.qa_chain = RetrievalQA.from_chain_type(llm=self.llm, chain_type="stuff", retriever=retriever,
+                                                    return_source_documents=True)
         
         # Define a custom prompt
-        custom_prompt = PromptTemplate(
+        self.prompt = PromptTemplate(
             input_variables=["context", "question"],
             template="Use the following extracted table data as context:\n\n{context}\n\nNow, answer this question: {question}"
         )
-        self.qa_chain.combine_documents_chain.llm_chain.prompt = custom_prompt
+        self.qa_chain.combine_documents_chain.llm_chain.prompt = self.prompt
 
     
     def ask_question(self, query):
         """Runs the QA system to answer a given query."""
-        return self.qa_chain.run(query)
+        with span("jsonqa.ask_question") as stage:
+            result = self.qa_chain.invoke({"query": query})
+            answer = result["result"]
+            if enabled():
+                # The "stuff" chain joins the retrieved tables with blank lines
+                documents = result["source_documents"]
+                context = "\n\n".join(document.page_content for document in documents)
+                stage.set(
+                    retrieved_docs=len(documents),
+                    context_tokens=approx_tokens(context),
+                    prompt_tokens=approx_tokens(self.prompt.format(context=context, question=query)),
+                    answer_tokens=approx_tokens(answer)
+                )
+        return answer
 
 # Example Usage
 if __name__ == "__main__":
@@ -2,20 +2,25 @@ import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.neighbors import NearestNeighbors
 
-def find_optimal_eps(cell_indices, k=4):
+def suggest_eps(cell_indices, k=4):
     """
-    Uses k-distance method to determine the optimal eps for DBSCAN.
-    :param cell_indices: Array of cell coordinates.
-    :param k: The k-th nearest neighbor to consider.
-    :return: Suggested eps value.
+    Picks eps for DBSCAN at the steepest rise of the sorted k-distance curve,
+    without plotting or printing (safe on worker threads).
+    :return: (suggested eps, sorted k-th nearest neighbor distances)
     """
     nbrs = NearestNeighbors(n_neighbors=k).fit(cell_indices)
     distances, indices = nbrs.kneighbors(cell_indices)
-    
+
     # Sort the k-th nearest distances
     k_distances = np.sort(distances[:, k - 1])
 
-    # Plot the k-distance graph
+    # Suggest an eps value based on the elbow point
+    elbow_index = np.argmax(np.diff(k_distances))  # Find steepest slope change
+    return k_distances[elbow_index], k_distances
+
+
+def plot_k_distances(k_distances, k=4):
+    """Shows the k-distance graph and closes its figure afterwards."""
     plt.figure(figsize=(8, 5))
     plt.plot(k_distances)
     plt.xlabel("Points sorted by distance")
@@ -23,10 +28,19 @@ def find_optimal_eps(cell_indices, k=4):
     plt.title("K-Distance Graph for DBSCAN")
     plt.grid(True)
     plt.show()
+    plt.close()
 
-    # Suggest an eps value based on the elbow point
-    elbow_index = np.argmax(np.diff(k_distances))  # Find steepest slope change
-    suggested_eps = k_distances[elbow_index]
+
+def find_optimal_eps(cell_indices, k=4):
+    """
+    Uses k-distance method to determine the optimal eps for DBSCAN, showing the
+    k-distance graph. Use suggest_eps() where no plot is wanted.
+    :param cell_indices: Array of cell coordinates.
+    :param k: The k-th nearest neighbor to consider.
+    :return: Suggested eps value.
+    """
+    suggested_eps, k_distances = suggest_eps(cell_indices, k)
+    plot_k_distances(k_distances, k)
     print(f"Suggested eps: {suggested_eps:.2f}")
 
     return suggested_eps
@@ -0,0 +1,192 @@
+import os
+import csv
+import time
+import hashlib
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from modules.sheetreader import read_sheet, occupied_cells
+from modules.evaluationdetection import cluster_cells, table_boxes
+from modules.sharedarrays import attach
+from modules.evaluationmetrics import load_boxes, evaluate, DEFAULT_THRESHOLDS
+
+CACHE_DIR = os.path.join(".cache", "cells")
+
+# Filled by the pool initializer so each worker loads the parsed corpus once
+_worker_cells = {}
+
+
+def _cache_path(file_path, sheet_name, cache_dir):
+    stat = os.stat(file_path)
+    key = f"{os.path.abspath(file_path)}|{sheet_name}|{stat.st_size}|{stat.st_mtime_ns}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npy")
+
+
+def load_cell_indices(file_path, sheet_name=None, cache_dir=CACHE_DIR):
+    """
+    Caches the non-empty cell coordinates of a worksheet as a .npy array,
+    parsing the workbook only if no cached copy exists for its current size
+    and modification time. Load the array with modules.sharedarrays.attach().
+    :return: Path of the cached .npy coordinate array.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = _cache_path(file_path, sheet_name, cache_dir)
+    if not os.path.exists(cache_path):
+        cell_indices = occupied_cells(read_sheet(file_path, sheet_name))
+        np.save(cache_path, cell_indices.astype(np.int32))
+    return cache_path
+
+
+def _load_one(entry):
+    name, file_path, sheet_name, cache_dir = entry
+    try:
+        return name, load_cell_indices(file_path, sheet_name, cache_dir), None
+    except Exception as e:
+        return name, None, str(e)
+
+
+def prepare_corpus(entries, cache_dir=CACHE_DIR, workers=None):
+    """
+    Parses every spreadsheet once (in parallel) into the coordinate cache.
+    :param entries: Iterable of (spreadsheet name, file path, sheet name).
+    :return: ({spreadsheet: cache path} for the sheets that parsed successfully,
+        {spreadsheet: error message} for the others).
+    """
+    jobs = [(name, path, sheet, cache_dir) for name, path, sheet in entries]
+    cache_paths = {}
+    errors = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for name, cache_path, error in pool.map(_load_one, jobs):
+            if error is not None:
+                print(f"Error parsing {name}: {error}")
+                errors[name] = error
+                continue
+            cache_paths[name] = cache_path
+    return cache_paths, errors
+
+
+def entries_from_inventory(csv_path, data_dir=None):
+    """
+    Reads (name, path, first sheet) triples from a spreadsheet inventory CSV such
+    as the one used by evaluationwrapper.py.
+    :param data_dir: Optional folder that replaces the directory of every path.
+    """
+    df = pd.read_csv(csv_path)
+    entries = []
+    for name, path, sheets in zip(df["Spreadsheet Name"], df["Absolute File Path"], df["Worksheet Names"]):
+        if data_dir is not None:
+            path = os.path.join(data_dir, name)
+        entries.append((name, path, sheets.split(";")[0].strip()))
+    return entries
+
+
+def _init_worker(cache_paths):
+    # Memory-mapped, so every worker reads the same cached pages instead of
+    # holding its own copy of the corpus
+    _worker_cells.clear()
+    for name, cache_path in cache_paths.items():
+        _worker_cells[name] = attach(cache_path)
+
+
+def predict_boxes(cells, eps, min_samples):
+    """Clusters every cached sheet with one parameter setting."""
+    pred_boxes = {}
+    for name, cell_indices in cells.items():
+        if len(cell_indices) == 0:
+            pred_boxes[name] = np.zeros((0, 4), dtype=np.int64)
+            continue
+        labels = cluster_cells(cell_indices, eps, min_samples)
+        pred_boxes[name] = table_boxes(cell_indices, labels)
+    return pred_boxes
+
+
+def _score_params(task):
+    params, gt_boxes, thresholds = task
+    start = time.perf_counter()
+    pred_boxes = predict_boxes(_worker_cells, params["eps"], params["min_samples"])
+    report = evaluate(gt_boxes, pred_boxes, thresholds)
+    row = dict(params)
+    for threshold, scores in report["thresholds"].items():
+        row[f"f1@{threshold}"] = scores["f1"]
+        row[f"precision@{threshold}"] = scores["precision"]
+        row[f"recall@{threshold}"] = scores["recall"]
+    row["seconds"] = time.perf_counter() - start
+    return row
+
+
+def run_sweep(cache_paths, gt_boxes, eps_values, min_samples_values,
+              thresholds=DEFAULT_THRESHOLDS, workers=None, failed=()):
+    """
+    Evaluates every (eps, min_samples) pair against ground truth in parallel.
+    Workers map the cached coordinates once and only cluster afterwards.
+    :param failed: Corpus sheets that could not be parsed. Their ground-truth
+        boxes are kept and count as missed by every setting.
+    :return: Result rows ranked by F1 at the first threshold.
+    """
+    gt_boxes = {name: boxes for name, boxes in gt_boxes.items() if name in cache_paths or name in failed}
+    grid = [
+        {"eps": float(eps), "min_samples": int(min_samples)}
+        for eps, min_samples in itertools.product(eps_values, min_samples_values)
+    ]
+    tasks = [(params, gt_boxes, thresholds) for params in grid]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cache_paths,)) as pool:
+        rows = list(pool.map(_score_params, tasks))
+
+    primary = f"f1@{float(thresholds[0])}"
+    rows.sort(key=lambda row: row[primary], reverse=True)
+    for rank, row in enumerate(rows, start=1):
+        row["rank"] = rank
+    return rows
+
+
+def print_results(rows, limit=20):
+    if not rows:
+        print("No results.")
+        return
+    score_keys = [key for key in rows[0] if key.startswith("f1@")]
+    print(f"{'rank':>4} {'eps':>6} {'min_samples':>11} " + " ".join(f"{key:>9}" for key in score_keys))
+    for row in rows[:limit]:
+        print(f"{row['rank']:>4} {row['eps']:>6.2f} {row['min_samples']:>11} "
+              + " ".join(f"{row[key]:>9.3f}" for key in score_keys))
+
+
+def save_results(rows, output_path):
+    columns = ["rank", "eps", "min_samples"] + [key for key in rows[0] if "@" in key] + ["seconds"]
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grid search DBSCAN parameters against ground-truth boxes.")
+    parser.add_argument("inventory", help="Spreadsheet inventory CSV")
+    parser.add_argument("gt_dir", help="Folder of ground-truth box JSON files")
+    parser.add_argument("--data-dir", help="Folder holding the spreadsheets, overrides inventory paths")
+    parser.add_argument("--eps", type=float, nargs="+", default=[1.0, 1.2, 1.4, 1.5, 2.0, 2.5, 3.0])
+    parser.add_argument("--min-samples", type=int, nargs="+", default=[1, 2, 3, 4, 5])
+    parser.add_argument("--thresholds", type=float, nargs="+", default=list(DEFAULT_THRESHOLDS))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--output", default="sweep_results.csv")
+    args = parser.parse_args()
+
+    entries = entries_from_inventory(args.inventory, args.data_dir)
+    start = time.perf_counter()
+    cache_paths, errors = prepare_corpus(entries, args.cache_dir, args.workers)
+    print(f"Parsed {len(cache_paths)} sheet(s) in {time.perf_counter() - start:.1f}s")
+
+    gt_boxes, _ = load_boxes(args.gt_dir)
+    start = time.perf_counter()
+    rows = run_sweep(cache_paths, gt_boxes, args.eps, args.min_samples, args.thresholds, args.workers, errors)
+    print(f"Evaluated {len(rows)} setting(s) in {time.perf_counter() - start:.1f}s")
+    missed = sum(len(gt_boxes[name]) for name in errors if name in gt_boxes)
+    if errors:
+        print(f"{len(errors)} sheet(s) failed to parse; their {missed} ground-truth box(es) count as misses")
+
+    print_results(rows)
+    if rows:
+        save_results(rows, args.output)
@@ -1,18 +1,25 @@
-import os
 import json
 import pandas as pd
+from modules.filecache import FileCache
+from modules.valueindex import lookup_tables_csv
 
-def json_to_csv_tables():
+def json_to_csv_tables(json_file_path="tables.json"):
     """
     Reads a JSON file with tables and saves each table as a cleaned CSV file.
     Returns a dictionary with table names and their CSV string content.
     Skips misleading header rows and numeric column keys.
     """
-    with open("tables.json", "r", encoding="utf-8") as f:
+    with open(json_file_path, "r", encoding="utf-8") as f:
         data = json.load(f)
 
     csv_outputs = {}
     for table_name, records in data["tables"].items():
+        # detect_tables stores each table as {"headers": ..., "data": [rows]}
+        if isinstance(records, dict):
+            records = records.get("data", [])
+        if not records:
+            continue
+
         # Convert list of dicts to DataFrame
         df = pd.DataFrame(records)
 
@@ -35,22 +42,76 @@ def json_to_csv_tables():
 
     return csv_outputs
 
-tables = json_to_csv_tables()
+# Sheets whose CSV tables are kept in memory, least recently used dropped first
+MAX_CACHED_SHEETS = 32
+
+_csv_cache = FileCache(json_to_csv_tables, MAX_CACHED_SHEETS)
 
-def generate_prompt(question):
-    
-    gemini_prompt = f"""
-    You are a question-answering system for tabular data.
-    Below are tables in CSV format:
 
-    {tables}
+def load_csv_tables(json_file_path="tables.json"):
+    """CSV tables of a detection output, converted once per version of the file."""
+    return _csv_cache.get(json_file_path)
 
+
+INSTRUCTIONS = """
     Answer the user's question based on these tables.
     Provide accurate calculations or lookups as needed.
     Format the response as plain text without any Markdown symbols (e.g., no *, **, _, #, or `).
     Use indentation or numbering for clarity, but avoid special characters for formatting.
+"""
+
+
+def context_prefix(json_file_path="tables.json"):
+    """
+    The part of the prompt that only depends on the sheet: role, all tables as
+    CSV and the answer instructions. It is identical for every question about
+    the same tables.json, so it can be cached and reused as a prefix.
+    """
+    return f"""
+    You are a question-answering system for tabular data.
+    Below are tables in CSV format:
+
+    {load_csv_tables(json_file_path)}
+{INSTRUCTIONS}"""
+
+
+def question_suffix(question):
+    return f"""
+    Question: {question}
+    """
+
+
+def batch_suffix(questions):
+    """Several questions for one request; answers come back as "Answer <n>:" sections."""
+    numbered = "\n".join(f"    Question {i}: {q}" for i, q in enumerate(questions, start=1))
+    return f"""
+    Answer each of the following questions separately. Start the answer to
+    question n with a line "Answer n:" and use no other headings.
+
+{numbered}
+    """
+
+
+def generate_prompt(question, json_file_path=None, matching_rows=None):
+    """
+    Builds the prompt from tables.json, or from another detection output when given.
+    :param matching_rows: Result of lookup_tables_csv() when the caller already
+        ran it; looked up here otherwise.
+    """
+    json_file_path = json_file_path or "tables.json"
+    # Lookup questions only need the rows holding the values they mention
+    if matching_rows is None:
+        matching_rows = lookup_tables_csv(question, json_file_path)
+    if not matching_rows:
+        return context_prefix(json_file_path) + question_suffix(question)
+    
+    gemini_prompt = f"""
+    You are a question-answering system for tabular data.
+    Below are the rows of the tables that match the question, in CSV format with their header row:
 
+    {matching_rows}
+{INSTRUCTIONS}
     Question: {question}
     """
 
-    return gemini_prompt
\ No newline at end of file
+    return gemini_prompt
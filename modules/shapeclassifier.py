@@ -0,0 +1,87 @@
+import numpy as np
+from scipy import ndimage
+
+# Occupancy grids above this many cells are left to DBSCAN
+MAX_GRID_CELLS = 50_000_000
+# So are grids over MAX_GRID_RATIO times the filled cell count (sparse sheets,
+# where the grid and its int32 labels would dwarf the cells), unless they are
+# below MIN_GRID_CELLS anyway
+MAX_GRID_RATIO = 16
+MIN_GRID_CELLS = 1_000_000
+
+
+def layout_blocks(cell_indices):
+    """
+    Cuts the occupancy grid into blocks with its projections: column bands
+    separated by empty columns, then row segments separated by rows that are
+    empty within the band. Cells in different blocks are never side by side.
+    :return: (block id per cell, number of blocks), or None for a huge or
+        sparse grid.
+    """
+    rows = cell_indices[:, 0] - cell_indices[:, 0].min()
+    cols = cell_indices[:, 1] - cell_indices[:, 1].min()
+    height, width = int(rows.max()) + 1, int(cols.max()) + 1
+    grid_cells = height * width
+    if grid_cells > MAX_GRID_CELLS or grid_cells > max(MAX_GRID_RATIO * len(cell_indices), MIN_GRID_CELLS):
+        return None
+
+    occupied_cols = np.zeros(width, dtype=bool)
+    occupied_cols[cols] = True
+    band_start = occupied_cols & ~np.r_[False, occupied_cols[:-1]]
+    band = (np.cumsum(band_start) - 1)[cols]
+    n_bands = int(band_start.sum())
+
+    band_rows = np.zeros((height, n_bands), dtype=bool)
+    band_rows[rows, band] = True
+    segment_start = band_rows & ~np.vstack([np.zeros((1, n_bands), dtype=bool), band_rows[:-1]])
+    segment = np.cumsum(segment_start, axis=0) - 1
+    band_offset = np.r_[0, np.cumsum(segment_start.sum(axis=0))[:-1]]
+    return band_offset[band] + segment[rows, band], int(segment_start.sum())
+
+
+def grid_labels(cell_indices, eps, min_samples=2):
+    """
+    DBSCAN labels for sheets whose layout can be proven simple without a
+    neighbor search, or None when clustering has to run.
+
+    With 1 <= eps < sqrt(2) two cells are neighbors only when they touch
+    side by side, so with min_samples <= 2 the clusters are the 4-connected
+    groups of cells (single cells are noise when min_samples is 2). A block
+    from layout_blocks() is one such group when every cell but its first has an
+    occupied cell to its left or above it, or else when the grid's 4-connected
+    components say so. Labels are numbered by first cell, as DBSCAN numbers them.
+    :param cell_indices: (n, 2) cell coordinates.
+    """
+    n = len(cell_indices)
+    if n == 0 or not 1 <= eps * eps < 2 or min_samples > 2:
+        return None
+    blocks = layout_blocks(cell_indices)
+    if blocks is None:
+        return None
+    block, n_blocks = blocks
+
+    rows = cell_indices[:, 0] - cell_indices[:, 0].min()
+    cols = cell_indices[:, 1] - cell_indices[:, 1].min()
+    grid = np.zeros((int(rows.max()) + 2, int(cols.max()) + 2), dtype=bool)
+    # One empty row and column in front, so row - 1 and col - 1 stay in bounds
+    grid[rows + 1, cols + 1] = True
+    linked = grid[rows + 1, cols] | grid[rows, cols + 1]
+    roots = np.bincount(block[~linked], minlength=n_blocks)
+    if (roots > 1).any():
+        # Holes (missing values in a table, ...) leave several roots: check
+        # that each of those blocks is still a single side-by-side group
+        components = ndimage.label(grid)[0][rows + 1, cols + 1]
+        low = np.full(n_blocks, components.max() + 1)
+        high = np.zeros(n_blocks, dtype=components.dtype)
+        np.minimum.at(low, block, components)
+        np.maximum.at(high, block, components)
+        if (low != high).any():
+            return None  # Fragmented sheet
+    sizes = np.bincount(block, minlength=n_blocks)
+    first_cell = np.full(n_blocks, n, dtype=np.int64)
+    np.minimum.at(first_cell, block, np.arange(n))
+    clustered = sizes >= min_samples
+    rank = np.full(n_blocks, -1, dtype=np.int64)
+    ids = np.flatnonzero(clustered)
+    rank[ids[np.argsort(first_cell[ids])]] = np.arange(len(ids))
+    return rank[block]
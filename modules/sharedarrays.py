@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from numpy.lib.format import open_memmap
+
+# RAM-backed on Linux, so handed-off arrays never touch the disk
+SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+class SharedArrays:
+    """
+    Arrays handed to worker processes as memory-mapped .npy files instead of
+    pickled copies. Tasks carry only the handles (file paths); workers map the
+    same pages with attach() and can fill output arrays created with empty()
+    in place. Everything is deleted on close().
+    """
+
+    def __init__(self, directory=SHARED_DIR):
+        self.directory = tempfile.mkdtemp(prefix="sheetqa-", dir=directory)
+        self._count = 0
+
+    def _path(self):
+        self._count += 1
+        return os.path.join(self.directory, f"{self._count}.npy")
+
+    def put(self, array):
+        """Copies an array into shared memory once. :return: Its handle."""
+        path = self._path()
+        np.save(path, np.ascontiguousarray(array))
+        return path
+
+    def empty(self, shape, dtype):
+        """A zeroed shared output array for workers to write. :return: Its handle."""
+        path = self._path()
+        shape = (int(shape),) if np.isscalar(shape) else tuple(shape)
+        open_memmap(path, mode="w+", dtype=dtype, shape=shape).flush()
+        return path
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(ref, writable=False):
+    """
+    The array behind a handle, mapped without copying. Arrays are returned as
+    they are, so the same task code runs inline without shared memory.
+    """
+    if isinstance(ref, np.ndarray):
+        return ref
+    return np.load(ref, mmap_mode="r+" if writable else "r")
@@ -1,10 +1,14 @@
+import os
 import pandas as pd
 import numpy as np
-from sklearn.cluster import DBSCAN
 import json
 from modules.jsoncleaner import clean_json_data
-from modules.parameters import find_optimal_eps
+from modules.evaluationdetection import cluster_cells
+from modules.sheetreader import read_sheet, occupied_cells
 from modules.visualizer import visualize_table_detection
+from modules.instrumentation import span
+from modules.columntypes import infer_column_types, json_records
+from modules.valueindex import build_value_index
 
 def detect_headers(table_df):
     """
@@ -85,6 +89,74 @@ def detect_headers(table_df):
         return []
 
 
+COMMENT_KEYWORDS = {"note", "comment", "description", "remark"}
+COMMENT_PROXIMITY = 2
+
+
+def comment_score(value):
+    """Scores a stripped cell value on length, word count and comment keywords."""
+    length_score = min(1, len(value) / 50)
+    word_count = len(value.split())
+    complexity_score = min(1, word_count / 5)
+    keyword_score = 1 if any(kw.lower() in value.lower() for kw in COMMENT_KEYWORDS) else 0
+    return (length_score + complexity_score + keyword_score) / 3
+
+
+def noise_comments(noise_indices, df_original):
+    """Scores noise points (label -1) as potential comments."""
+    comments = []
+    for i, j in noise_indices:
+        value = df_original.iloc[i, j]
+        if pd.isna(value):
+            continue
+        value = str(value).strip()
+        if comment_score(value) > 0.6:
+            comments.append({"row": int(i), "col": int(j), "value": value, "table_association": None})
+    return comments
+
+
+def halo_comments(bounds, df_original):
+    """
+    Scores the cells within COMMENT_PROXIMITY of a table's bounds (but outside
+    it) as potential comments, in row-major order. Only depends on the bounds and
+    the values in that ring.
+    """
+    min_row, max_row, min_col, max_col = bounds
+    candidates = []
+    for i in range(max(0, min_row - COMMENT_PROXIMITY), max_row + COMMENT_PROXIMITY + 1):
+        if i >= df_original.shape[0]:
+            break
+        for j in range(max(0, min_col - COMMENT_PROXIMITY), max_col + COMMENT_PROXIMITY + 1):
+            if min_row <= i <= max_row and min_col <= j <= max_col:
+                continue
+            if j >= df_original.shape[1]:
+                break
+            value = df_original.iloc[i, j]
+            if pd.isna(value):
+                continue
+            value = str(value).strip()
+            if comment_score(value) > 0.6:
+                candidates.append({"row": int(i), "col": int(j), "value": value})
+    return candidates
+
+
+def merge_comments(comments, table_candidates):
+    """
+    Appends each table's halo candidates in table order, skipping cells that
+    are already comments.
+    :param table_candidates: List of halo_comments() results, one per table.
+    """
+    seen = {(c["row"], c["col"]) for c in comments}
+    comments = list(comments)
+    for table_idx, candidates in enumerate(table_candidates):
+        for c in candidates:
+            if (c["row"], c["col"]) in seen:
+                continue
+            seen.add((c["row"], c["col"]))
+            comments.append(dict(c, table_association=f"table {table_idx + 1}"))
+    return comments
+
+
 def detect_comments(cell_indices, labels, df_original, table_bounds):
     """
     Detects comments from noise points and cells near tables.
@@ -95,149 +167,153 @@ def detect_comments(cell_indices, labels, df_original, table_bounds):
     :param table_bounds: List of (min_row, max_row, min_col, max_col) for each table.
     :return: List of comments with coordinates, values, and table associations.
     """
-    comments = []
-    proximity_distance = 2
-    keywords = {"note", "comment", "description", "remark"}
-    
-    noise_indices = cell_indices[labels == -1]
-    for i, j in noise_indices:
-        value = df_original.iloc[i, j]
-        if pd.isna(value):
-            continue
-        value = str(value).strip()
-        
-        length_score = min(1, len(value) / 50)
-        word_count = len(value.split())
-        complexity_score = min(1, word_count / 5)
-        keyword_score = 1 if any(kw.lower() in value.lower() for kw in keywords) else 0
-        comment_score = (length_score + complexity_score + keyword_score) / 3
-        
-        if comment_score > 0.6:
-            comments.append({"row": int(i), "col": int(j), "value": value, "table_association": None})
-    
-    for table_idx, (min_row, max_row, min_col, max_col) in enumerate(table_bounds):
-        row_range = range(max(0, min_row - proximity_distance), max_row + proximity_distance + 1)
-        col_range = range(max(0, min_col - proximity_distance), max_col + proximity_distance + 1)
-        
-        for i in row_range:
-            for j in col_range:
-                if (min_row <= i <= max_row and min_col <= j <= max_col) or \
-                   any(c["row"] == i and c["col"] == j for c in comments):
-                    continue
-                if i >= df_original.shape[0] or j >= df_original.shape[1]:
-                    continue
-                value = df_original.iloc[i, j]
-                if pd.isna(value):
-                    continue
-                value = str(value).strip()
-                
-                length_score = min(1, len(value) / 50)
-                word_count = len(value.split())
-                complexity_score = min(1, word_count / 5)
-                keyword_score = 1 if any(kw.lower() in value.lower() for kw in keywords) else 0
-                comment_score = (length_score + complexity_score + keyword_score) / 3
-                
-                if comment_score > 0.6:
-                    comments.append({
-                        "row": int(i),
-                        "col": int(j),
-                        "value": value,
-                        "table_association": f"table {table_idx + 1}"
-                    })
-    
-    return comments
+    comments = noise_comments(cell_indices[labels == -1], df_original)
+    if len(table_bounds) == 1 and not comments and (labels >= 0).all():
+        return []  # One table holding every cell: nothing lies around it
+    return merge_comments(comments, [halo_comments(bounds, df_original) for bounds in table_bounds])
+
+
+def build_table(df_original, bounds):
+    """
+    Builds the DataFrame of one table region, detects its header row and
+    infers the type of every data column.
+    :param bounds: (min_row, max_row, min_col, max_col) of the region.
+    :return: Table info dict with data, column_types, header_indices, headers and bounds.
+    """
+    min_row, max_row, min_col, max_col = bounds
+    table_df = df_original.iloc[min_row:max_row + 1, min_col:max_col + 1].copy()
+    table_df = table_df.applymap(lambda x: str(x).strip() if pd.notna(x) else "")
+
+    header_indices = detect_headers(table_df)
+    if header_indices:
+        # Use first header row for column names
+        header_row = table_df.iloc[header_indices[0]]
+        table_df.columns = [str(val) if pd.notna(val) else f"col_{j}" for j, val in enumerate(header_row)]
+        cols_series = pd.Series(table_df.columns)
+        if cols_series.duplicated().any():
+            for dup in cols_series[cols_series.duplicated()].unique():
+                cols_series[cols_series == dup] = [f"{dup}_{j}" for j in range(sum(cols_series == dup))]
+            table_df.columns = cols_series
+        # Exclude header rows from data
+        data_df = table_df.iloc[len(header_indices):].reset_index(drop=True)
+        # Store headers as dictionaries
+        headers = [table_df.iloc[idx].to_dict() for idx in header_indices]
+    else:
+        table_df.columns = [f"col_{j}" for j in range(table_df.shape[1])]
+        data_df = table_df
+        headers = []
+
+    data_df.replace(["", "nan", "None", "null"], None, inplace=True)
+    # Typed columns (numbers, dates, booleans, categories) instead of strings
+    data_df, column_types = infer_column_types(data_df)
+    return {
+        "data": data_df,
+        "column_types": column_types,
+        "header_indices": header_indices,
+        "headers": headers,
+        "bounds": tuple(int(v) for v in bounds)
+    }
 
-def detect_tables(file_path, visualize=False):
-    df = pd.read_excel(file_path, header=None, dtype=str)
-    df_original = df.copy()
-    df = df.dropna(axis=1, how="all")
 
-    data = df_original.replace("", np.nan).values
-    cell_indices = np.argwhere(pd.notnull(data))
-    
-    tables = {}
+def cluster_bounds(cell_indices, labels):
+    """Returns (min_row, max_row, min_col, max_col) of every cluster, ordered by label."""
     table_bounds = []
+    for label in sorted(set(labels) - {-1}):
+        table_cells = cell_indices[labels == label]
+        rows = table_cells[:, 0]
+        cols = table_cells[:, 1]
+        table_bounds.append((rows.min(), rows.max(), cols.min(), cols.max()))
+    return table_bounds
+
+
+def build_tables(df_original, cell_indices, labels):
+    """
+    Builds a DataFrame per DBSCAN cluster and detects its header row.
+    :return: ({table_name: table_info}, list of (min_row, max_row, min_col, max_col))
+    """
+    table_bounds = cluster_bounds(cell_indices, labels)
+    tables = {
+        f"table {i}": build_table(df_original, bounds)
+        for i, bounds in enumerate(table_bounds, start=1)
+    }
+    return tables, table_bounds
+
 
-    if len(cell_indices) > 0:
-        optimal_eps = find_optimal_eps(cell_indices)
-        clustering = DBSCAN(eps=1.4, min_samples=2).fit(cell_indices)
-        labels = clustering.labels_
-
-        unique_labels = sorted(set(labels) - {-1})
-        for i, label in enumerate(unique_labels, start=1):
-            table_cells = cell_indices[labels == label]
-            rows = table_cells[:, 0]
-            cols = table_cells[:, 1]
-
-            min_row, max_row = rows.min(), rows.max()
-            min_col, max_col = cols.min(), cols.max()
-            table_bounds.append((min_row, max_row, min_col, max_col))
-
-            table_df = df_original.iloc[min_row:max_row + 1, min_col:max_col + 1].copy()
-            table_df = table_df.applymap(lambda x: str(x).strip() if pd.notna(x) else "")
-
-            header_indices = detect_headers(table_df)
-            if header_indices:
-                # Use first header row for column names
-                header_row = table_df.iloc[header_indices[0]]
-                table_df.columns = [str(val) if pd.notna(val) else f"col_{j}" for j, val in enumerate(header_row)]
-                cols_series = pd.Series(table_df.columns)
-                if cols_series.duplicated().any():
-                    for dup in cols_series[cols_series.duplicated()].unique():
-                        cols_series[cols_series == dup] = [f"{dup}_{j}" for j in range(sum(cols_series == dup))]
-                    table_df.columns = cols_series
-                # Exclude header rows from data
-                data_df = table_df.iloc[len(header_indices):].reset_index(drop=True)
-                # Store headers as dictionaries
-                headers = [table_df.iloc[idx].to_dict() for idx in header_indices]
-            else:
-                table_df.columns = [f"col_{j}" for j in range(table_df.shape[1])]
-                data_df = table_df
-                headers = []
-
-            data_df.replace(["", "nan", "None", "null"], None, inplace=True)
-            tables[f"table {i}"] = {
-                "data": data_df,
-                "header_indices": header_indices,
-                "headers": headers
+def tables_to_json(tables, comments):
+    """Builds the JSON-serializable detection result."""
+    return {
+        "total_tables": len(tables),
+        "tables": {
+            table_name: {
+                "headers": table_info["headers"],
+                "column_types": table_info["column_types"],
+                "data": json_records(table_info["data"])
             }
+            for table_name, table_info in tables.items()
+        },
+        "comments": comments
+    }
 
-        comments = detect_comments(cell_indices, labels, df_original, table_bounds)
-
-        table_jsons = {
-            "total_tables": len(tables),
-            "tables": {
-                table_name: {
-                    "headers": table_info["headers"],
-                    "data": table_info["data"].to_dict(orient='records')
-                }
-                for table_name, table_info in tables.items()
-            },
-            "comments": comments
-        }
-
-        if visualize:
-            header_cells = [
-                (min_row + idx, col_idx)
-                for table_name, table_info in tables.items()
-                for idx in table_info["header_indices"]
-                for col_idx in range(len(table_info["data"].columns))
-            ]
-            comment_cells = [(c["row"], c["col"]) for c in comments]
-            visualize_table_detection(
-                cell_indices,
-                labels,
-                headers=header_cells,
-                comments=comment_cells,
-                image_path="table_detection.png"
-            )
 
-        json_file_path = "tables.json"
-        with open(json_file_path, "w", encoding="utf-8") as file:
-            json.dump(table_jsons, file, indent=4)
+def write_tables_json(table_jsons, json_file_path="tables.json"):
+    """
+    Writes the detection result, cleans it in place and indexes its cell values
+    (see modules.valueindex). Returns the table count.
+    """
+    with open(json_file_path, "w", encoding="utf-8") as file:
+        json.dump(table_jsons, file, indent=4)
+
+    table_count = clean_json_data(json_file_path)
+    build_value_index(json_file_path)
+    return table_count
+
+
+def visualize_tables(cell_indices, labels, tables, comments, image_path="table_detection.png"):
+    """Renders the clusters with header and comment cells highlighted."""
+    header_cells = [
+        (table_info["bounds"][0] + idx, table_info["bounds"][2] + col_idx)
+        for table_name, table_info in tables.items()
+        for idx in table_info["header_indices"]
+        for col_idx in range(len(table_info["data"].columns))
+    ]
+    comment_cells = [(c["row"], c["col"]) for c in comments]
+    visualize_table_detection(
+        cell_indices,
+        labels,
+        headers=header_cells,
+        comments=comment_cells,
+        image_path=image_path
+    )
+
+
+def detect_tables(file_path, visualize=False, json_file_path="tables.json", image_path="table_detection.png"):
+    with span("detect_tables", file=os.path.basename(file_path)) as root:
+        with span("read") as stage:
+            df_original = read_sheet(file_path)
+            cell_indices = occupied_cells(df_original)
+            stage.set(cells=len(cell_indices))
+        root.set(cells=len(cell_indices))
+
+        if len(cell_indices) > 0:
+            with span("clustering", cells=len(cell_indices)):
+                labels = cluster_cells(cell_indices, eps=1.4, min_samples=2)
+
+            with span("header_detection") as stage:
+                tables, table_bounds = build_tables(df_original, cell_indices, labels)
+                stage.set(tables=len(tables))
+            with span("comment_detection") as stage:
+                comments = detect_comments(cell_indices, labels, df_original, table_bounds)
+                stage.set(comments=len(comments))
+
+            if visualize:
+                with span("visualization"):
+                    visualize_tables(cell_indices, labels, tables, comments, image_path)
 
-        new_table_length = clean_json_data(json_file_path)
+            with span("json_output"):
+                table_jsons = tables_to_json(tables, comments)
+                new_table_length = write_tables_json(table_jsons, json_file_path)
+            root.set(tables=new_table_length)
 
-        return new_table_length, "table_detection.png" if visualize else None
+            return new_table_length, image_path if visualize else None
 
-    return 0, None
\ No newline at end of file
+        return 0, None
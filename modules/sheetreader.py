@@ -0,0 +1,22 @@
+import pandas as pd
+import numpy as np
+
+
+def read_sheet(file_path, sheet_name=None):
+    """
+    Reads one worksheet as a string DataFrame without a header row.
+    :param file_path: Path to the Excel file.
+    :param sheet_name: Worksheet name or index. None reads the first sheet.
+    :return: DataFrame of cell values (str or NaN).
+    """
+    if sheet_name is None:
+        sheet_name = 0
+    return pd.read_excel(file_path, sheet_name=sheet_name, header=None, dtype=str)
+
+
+def occupied_cells(df):
+    """
+    Returns the (row, col) coordinates of every non-empty cell, in row-major order.
+    """
+    data = df.replace("", np.nan).values
+    return np.argwhere(pd.notnull(data))
@@ -0,0 +1,234 @@
+import math
+from array import array
+import numpy as np
+from openpyxl import load_workbook
+from pandas._libs.parsers import STR_NA_VALUES
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from sklearn.neighbors import NearestNeighbors
+from concurrent.futures import ProcessPoolExecutor
+from modules.sharedarrays import SharedArrays, attach
+from modules.sheetreader import read_sheet, occupied_cells
+
+# Workbook formats openpyxl can stream; others (.xls, ...) are read with pandas
+STREAMABLE_EXTENSIONS = (".xlsx", ".xlsm", ".xltx", ".xltm")
+
+
+def stream_occupied_cells(file_path, sheet_name=None):
+    """
+    Streams a worksheet with openpyxl's read-only mode and returns the (row, col)
+    coordinates of non-empty cells, without building a DataFrame.
+    Emptiness follows pd.read_excel(dtype=str): blanks, error cells and the
+    default NA strings do not count. Formats openpyxl cannot open (.xls, ...)
+    are read whole with read_sheet() instead.
+    :return: (n, 2) int array in row-major order, same as occupied_cells().
+    """
+    if not file_path.lower().endswith(STREAMABLE_EXTENSIONS):
+        return occupied_cells(read_sheet(file_path, sheet_name)).astype(np.int64)
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        if sheet_name is None or isinstance(sheet_name, int):
+            worksheet = workbook.worksheets[sheet_name or 0]
+        else:
+            worksheet = workbook[sheet_name]
+
+        rows, cols = array("i"), array("i")
+        for i, row in enumerate(worksheet.iter_rows()):
+            for j, cell in enumerate(row):
+                value = cell.value
+                if value is None or cell.data_type == "e":
+                    continue
+                if isinstance(value, str) and value in STR_NA_VALUES:
+                    continue
+                rows.append(i)
+                cols.append(j)
+    finally:
+        workbook.close()
+
+    return np.column_stack([
+        np.frombuffer(rows, dtype=np.int32),
+        np.frombuffer(cols, dtype=np.int32)
+    ]).astype(np.int64)
+
+
+def band_slices(cell_indices, band_rows, halo):
+    """
+    Splits row-major cell coordinates into horizontal bands.
+    :return: List of (own_start, own_end, near_start, near_end, ext_start, ext_end)
+        index ranges. A band owns the cells in its rows, classifies the cells
+        within `halo` rows of them and reads cells up to 2 * halo rows away.
+    """
+    rows = cell_indices[:, 0]
+    if len(rows) == 0:
+        return []
+    slices = []
+    first_row, last_row = int(rows[0]), int(rows[-1])
+    for top in range(first_row - first_row % band_rows, last_row + 1, band_rows):
+        bottom = top + band_rows
+        own_start, own_end = np.searchsorted(rows, [top, bottom])
+        if own_start == own_end:
+            continue
+        near_start, near_end = np.searchsorted(rows, [top - halo, bottom + halo])
+        ext_start, ext_end = np.searchsorted(rows, [top - 2 * halo, bottom + 2 * halo])
+        slices.append(tuple(int(v) for v in (own_start, own_end, near_start, near_end, ext_start, ext_end)))
+    return slices
+
+
+def _cluster_band(task):
+    """
+    Clusters one band. Every cell within `halo` rows of the band has all of its
+    neighbors inside the extended slice, so its core flag is exact; core cells
+    are connected through pairs with at least one owned end.
+    Writes the core flags of the owned cells to `core_out` and the component id
+    (or -1) of every near cell to `components_out` from `component_offset` on;
+    arrays may be passed as sharedarrays handles.
+    :return: (owned border cell offsets, core neighbor offsets), relative to the
+        extended slice.
+    """
+    cells, (ext_start, ext_end), near, owned, eps, min_samples, core_out, components_out, component_offset = task
+    ext_cells = attach(cells)[ext_start:ext_end]
+    near_start, near_end = near
+    own_start, own_end = owned
+    n = len(ext_cells)
+
+    neighbors = NearestNeighbors(radius=eps).fit(ext_cells)
+    graph = neighbors.radius_neighbors_graph(ext_cells[near_start:near_end], mode="connectivity")
+
+    core = np.zeros(n, dtype=bool)
+    core[near_start:near_end] = np.diff(graph.indptr) >= min_samples
+
+    pairs = graph[own_start - near_start:own_end - near_start].tocoo()
+    sources = pairs.row + own_start
+    targets = pairs.col
+    core_target = core[targets]
+
+    edge_mask = core[sources] & core_target
+    edges = coo_matrix(
+        (np.ones(int(edge_mask.sum()), dtype=np.int8), (sources[edge_mask], targets[edge_mask])),
+        shape=(n, n)
+    )
+    _, components = connected_components(edges, directed=False)
+
+    attach(core_out, writable=True)[ext_start + own_start:ext_start + own_end] = core[own_start:own_end]
+    attach(components_out, writable=True)[component_offset:component_offset + near_end - near_start] = \
+        np.where(core, components, -1)[near_start:near_end]
+    border_mask = ~core[sources] & core_target
+    return sources[border_mask], targets[border_mask]
+
+
+class UnionFind:
+    def __init__(self, size):
+        self.parent = np.arange(size)
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def _band_tasks(slices, near_offsets, cells, core_out, components_out, eps, min_samples):
+    return [
+        (cells, (ext_start, ext_end), (near_start - ext_start, near_end - ext_start),
+         (own_start - ext_start, own_end - ext_start), eps, min_samples,
+         core_out, components_out, int(near_offset))
+        for (own_start, own_end, near_start, near_end, ext_start, ext_end), near_offset in zip(slices, near_offsets)
+    ]
+
+
+def _map(fn, tasks, workers):
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(fn, tasks))
+    return [fn(task) for task in tasks]
+
+
+def tiled_dbscan(cell_indices, eps, min_samples=2, band_rows=5000, workers=1):
+    """
+    DBSCAN over row bands of a sheet, giving the same labels as
+    DBSCAN(eps, min_samples).fit(cell_indices) while only ever building
+    neighbor indexes over one band (plus its halo rows) at a time.
+
+    Each band reads up to twice the neighborhood radius beyond its rows, which
+    lets it decide core cells and connect them in a single neighbor search;
+    components that meet in the halo rows are stitched with a union-find
+    merge. Clusters are numbered, and border cells assigned, in the same order
+    as sklearn's DBSCAN.
+    :param cell_indices: (n, 2) row-major coordinates, e.g. from occupied_cells().
+    :param band_rows: Sheet rows owned by each band.
+    :param workers: Worker processes for the bands; 1 runs them inline. Workers
+        get the coordinates and return core flags and components through
+        shared memory (modules.sharedarrays) rather than pickled copies.
+    :return: Label array, -1 for noise.
+    """
+    n = len(cell_indices)
+    labels = np.full(n, -1, dtype=np.int64)
+    if n == 0:
+        return labels
+
+    halo = int(math.floor(eps))
+    slices = band_slices(cell_indices, band_rows, halo)
+    # Component ids of each band's near cells, packed one band after another
+    near_offsets = np.r_[0, np.cumsum([near_end - near_start for _, _, near_start, near_end, _, _ in slices])]
+    if workers and workers > 1:
+        # Workers map the coordinates and write their outputs in place
+        with SharedArrays() as shared:
+            cells, core_out, components_out = (
+                shared.put(cell_indices), shared.empty(n, bool), shared.empty(int(near_offsets[-1]), np.int64)
+            )
+            tasks = _band_tasks(slices, near_offsets, cells, core_out, components_out, eps, min_samples)
+            results = _map(_cluster_band, tasks, workers)
+            core, near_components = np.load(core_out), np.load(components_out)
+    else:
+        core = np.zeros(n, dtype=bool)
+        near_components = np.empty(int(near_offsets[-1]), dtype=np.int64)
+        tasks = _band_tasks(slices, near_offsets, cell_indices, core, near_components, eps, min_samples)
+        results = _map(_cluster_band, tasks, workers)
+    band_components = [near_components[start:end] for start, end in zip(near_offsets[:-1], near_offsets[1:])]
+
+    # Give every band-local component a global id, then merge components that
+    # share a core cell (one band owns it, a neighboring band sees it as halo).
+    owner_component = np.full(n, -1, dtype=np.int64)
+    offsets = []
+    total = 0
+    for (own_start, own_end, near_start, _, _, _), components in zip(slices, band_components):
+        offsets.append(total)
+        local = components[own_start - near_start:own_end - near_start]
+        owner_component[own_start:own_end] = np.where(local >= 0, local + total, -1)
+        total += int(components.max()) + 1
+
+    union_find = UnionFind(total)
+    for (own_start, own_end, near_start, near_end, _, _), offset, components in zip(slices, offsets, band_components):
+        halo_offsets = np.r_[0:own_start - near_start, own_end - near_start:near_end - near_start]
+        for k in halo_offsets[components[halo_offsets] >= 0]:
+            union_find.union(owner_component[near_start + k], components[k] + offset)
+
+    root_of = np.array([union_find.find(c) for c in range(total)], dtype=np.int64)
+    core_points = np.flatnonzero(core)
+    roots = root_of[owner_component[core_points]]
+    # Number clusters by their lowest-index core cell, like sklearn does
+    _, first_seen, inverse = np.unique(roots, return_index=True, return_inverse=True)
+    rank = np.empty(len(first_seen), dtype=np.int64)
+    rank[np.argsort(first_seen)] = np.arange(len(first_seen))
+    labels[core_points] = rank[inverse]
+
+    # A border cell joins the earliest-numbered cluster among its core neighbors
+    for (_, _, _, _, ext_start, _), (border, neighbor) in zip(slices, results):
+        if len(border) == 0:
+            continue
+        border = border + ext_start
+        candidate = labels[neighbor + ext_start]
+        best = {}
+        for b, c in zip(border.tolist(), candidate.tolist()):
+            if b not in best or c < best[b]:
+                best[b] = c
+        labels[list(best)] = list(best.values())
+
+    return labels
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+STORE_DIR = os.path.join("files", "store")
+DEFAULT_QUOTA_BYTES = 1024 * 2 ** 20
+EVICTION_INTERVAL_SECONDS = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    hash TEXT NOT NULL REFERENCES blobs(hash),
+    uploaded_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (user_id, name)
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    hash TEXT NOT NULL REFERENCES blobs(hash),
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    meta TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (hash, kind)
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blobs_by_access ON blobs(last_access);
+"""
+
+
+class UploadStore:
+    """
+    SQLite registry of user uploads and the artifacts derived from them.
+
+    Files are stored once per content hash under `root/blobs`, so identical
+    uploads from different users share one copy and user-supplied names never
+    collide. Each (user, name) points at its latest version. Derived artifacts
+    (tables.json, detection images, ...) live under `root/artifacts/<hash>` and
+    survive restarts. Uploads not accessed recently are evicted, with their
+    artifacts, once the store grows past `quota_bytes`.
+    """
+
+    def __init__(self, root=STORE_DIR, quota_bytes=DEFAULT_QUOTA_BYTES):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(root, "artifacts"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "store.db"), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+        self._stop = threading.Event()
+        self._evictor = None
+
+    def put(self, user_id, name, data):
+        """
+        Stores an upload, writing the file only if its content is new.
+        :return: (file path, content hash, whether the name now points at different content)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        extension = os.path.splitext(name)[1].lower() or ".bin"
+        path = os.path.join(self.root, "blobs", digest[:2], digest + extension)
+        now = time.time()
+        with self._lock, self._db:
+            blob = self._db.execute("SELECT path FROM blobs WHERE hash = ?", (digest,)).fetchone()
+            if blob is None or not os.path.exists(blob["path"]):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO blobs (hash, path, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (digest, path, len(data), now, now)
+                )
+            else:
+                path = blob["path"]
+                self._db.execute("UPDATE blobs SET last_access = ? WHERE hash = ?", (now, digest))
+
+            previous = self._db.execute(
+                "SELECT hash FROM uploads WHERE user_id = ? AND name = ?", (user_id, name)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO uploads (user_id, name, hash, uploaded_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (user_id, name, digest, now, now)
+            )
+        return path, digest, previous is not None and previous["hash"] != digest
+
+    def resolve(self, user_id, name):
+        """
+        Looks up a user's upload by name and marks it as accessed.
+        :return: (file path, content hash), or None if unknown or evicted.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT blobs.hash, blobs.path FROM uploads JOIN blobs ON blobs.hash = uploads.hash "
+                "WHERE uploads.user_id = ? AND uploads.name = ?", (user_id, name)
+            ).fetchone()
+            if row is None or not os.path.exists(row["path"]):
+                return None
+            self._db.execute("UPDATE uploads SET last_access = ? WHERE user_id = ? AND name = ?", (now, user_id, name))
+            self._db.execute("UPDATE blobs SET last_access = ? WHERE hash = ?", (now, row["hash"]))
+        return row["path"], row["hash"]
+
+    def list_uploads(self, user_id):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, hash, uploaded_at, last_access FROM uploads WHERE user_id = ? ORDER BY uploaded_at",
+                (user_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def artifact_path(self, digest, filename):
+        """Where an artifact of an upload should be written."""
+        directory = os.path.join(self.root, "artifacts", digest)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+
+    def add_artifact(self, digest, kind, path, meta=None):
+        """
+        Registers a written artifact (e.g. kind "tables_json") with optional JSON
+        metadata. A file belongs to one upload: registering a path again (state
+        shared by the versions of a workbook, ...) moves it to this upload. A file
+        replaced by a new path for the same (upload, kind) is deleted, so it is
+        never left on disk uncounted.
+        """
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        with self._lock, self._db:
+            previous = self._db.execute(
+                "SELECT path FROM artifacts WHERE hash = ? AND kind = ?", (digest, kind)
+            ).fetchone()
+            self._db.execute("DELETE FROM artifacts WHERE path = ?", (path,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO artifacts (hash, kind, path, size, meta, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, kind, path, size, json.dumps(meta), time.time())
+            )
+            if previous is not None and previous["path"] != path:
+                still_used = self._db.execute(
+                    "SELECT 1 FROM artifacts WHERE path = ?", (previous["path"],)
+                ).fetchone()
+                if still_used is None and os.path.exists(previous["path"]):
+                    os.remove(previous["path"])
+
+    def artifact(self, digest, kind):
+        """:return: (path, meta) of a registered artifact that still exists, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT path, meta FROM artifacts WHERE hash = ? AND kind = ?", (digest, kind)
+            ).fetchone()
+        if row is None or not os.path.exists(row["path"]):
+            return None
+        return row["path"], json.loads(row["meta"]) if row["meta"] else None
+
+    def set_session(self, user_id, **data):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?)",
+                (user_id, json.dumps(data), time.time())
+            )
+
+    def get_session(self, user_id):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def usage(self):
+        """Bytes used by stored uploads and their artifacts."""
+        with self._lock:
+            blobs = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            artifacts = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+        return blobs + artifacts
+
+    def evict(self, quota_bytes=None):
+        """
+        Deletes the least recently accessed uploads, with their artifacts and the
+        names pointing at them, until usage fits the quota.
+        :return: Hashes of the evicted uploads.
+        """
+        quota_bytes = self.quota_bytes if quota_bytes is None else quota_bytes
+        evicted = []
+        with self._lock, self._db:
+            used = (self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0] +
+                    self._db.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0])
+            for row in self._db.execute("SELECT hash, path, size FROM blobs ORDER BY last_access").fetchall():
+                if used <= quota_bytes:
+                    break
+                digest = row["hash"]
+                artifact_rows = self._db.execute("SELECT path, size FROM artifacts WHERE hash = ?",
+                                                 (digest,)).fetchall()
+                artifacts = sum(artifact["size"] for artifact in artifact_rows)
+                self._db.execute("DELETE FROM artifacts WHERE hash = ?", (digest,))
+                self._db.execute("DELETE FROM uploads WHERE hash = ?", (digest,))
+                self._db.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+                # Artifacts may live outside the upload's artifact directory
+                for path in [row["path"]] + [artifact["path"] for artifact in artifact_rows]:
+                    if os.path.exists(path):
+                        os.remove(path)
+                shutil.rmtree(os.path.join(self.root, "artifacts", digest), ignore_errors=True)
+                used -= row["size"] + artifacts
+                evicted.append(digest)
+        return evicted
+
+    def start_eviction(self, interval=EVICTION_INTERVAL_SECONDS):
+        """Runs evict() every `interval` seconds in a daemon thread."""
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    evicted = self.evict()
+                    if evicted:
+                        print(f"🧹 Evicted {len(evicted)} upload(s) to stay under the storage quota.")
+                except Exception as e:
+                    print(f"Error evicting uploads: {e}")
+
+        if self._evictor is None:
+            self._evictor = threading.Thread(target=run, daemon=True)
+            self._evictor.start()
+        return self._evictor
+
+    def close(self):
+        self._stop.set()
+        if self._evictor is not None:
+            self._evictor.join()
+        with self._lock:
+            self._db.close()
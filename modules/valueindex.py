@@ -0,0 +1,209 @@
+import os
+import re
+import json
+import unicodedata
+import pandas as pd
+from modules.filecache import FileCache
+from modules.instrumentation import traced
+
+# Question tokens found in more rows than this are not selective enough for a
+# lookup ("the", "male", a year shared by every row, ...)
+MAX_LOOKUP_ROWS = 20
+
+# Question words that never make a lookup on their own, even when a cell
+# happens to contain them ("the Countess of Rothes")
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "to", "for", "by", "with", "from", "and", "or", "not",
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "has", "have", "had",
+    "what", "which", "who", "whom", "whose", "when", "where", "why", "how", "many", "much",
+    "i", "me", "my", "we", "our", "you", "your", "it", "its", "this", "that", "these", "those",
+    "there", "their", "they", "them", "he", "she", "his", "her", "all", "any", "each", "per",
+    "can", "could", "please", "tell", "give", "show", "find", "list", "s"
+}
+
+# Words of questions about a table as a whole rather than about given rows.
+# Those always get the full tables, even when they name a rare value
+# ("average fare of passengers older than 70").
+AGGREGATE_WORDS = {
+    "average", "avg", "mean", "median", "mode", "sum", "total", "count", "number", "many", "much",
+    "max", "maximum", "min", "minimum", "highest", "lowest", "largest", "smallest", "most", "least",
+    "top", "bottom", "more", "less", "fewer", "greater", "than", "over", "under", "above", "below",
+    "older", "younger", "between", "versus", "vs", "compare", "compared", "others", "percent",
+    "percentage", "ratio", "proportion", "distribution", "every", "all", "each", "overall"
+}
+COMPARISON_SYMBOLS = re.compile(r"[<>=≤≥≠]")
+# "What is Braund's age?": the named value may sit in any column
+POSSESSIVE_LOOKUP = re.compile(r"\b(?:who|what|which|when|where)\s+(?:is|was|are|were)\b.*\w['’]s\s+\w", re.IGNORECASE)
+
+# Columns where at least this share of the values are distinct (names, IDs,
+# tickets, ...) identify rows; other values only make a lookup through the
+# possessive pattern
+IDENTIFIER_MIN_DISTINCT = 0.9
+
+# Loaded indexes and tables.json files kept in memory, least recently used
+# dropped first
+MAX_LOADED = 32
+
+
+def tokenize(value):
+    """Normalized tokens of a cell value or question: casefolded words and numbers."""
+    text = unicodedata.normalize("NFKC", str(value)).casefold()
+    return re.findall(r"\d+(?:\.\d+)?|\w+", text)
+
+
+def is_lookup(question):
+    """
+    Whether a question asks about particular rows: no aggregate or comparison
+    wording and no comparison operators.
+    """
+    if COMPARISON_SYMBOLS.search(question):
+        return False
+    return not set(tokenize(question)) & AGGREGATE_WORDS
+
+
+def value_index_path(json_file_path="tables.json"):
+    """The index is stored next to the detection output, e.g. tables.index.json."""
+    return os.path.splitext(json_file_path)[0] + ".index.json"
+
+
+class ValueIndex:
+    """
+    Inverted index from normalized cell tokens to the (table, row, column)
+    positions holding them, over every table of one tables.json artifact.
+    Rows are positions in the artifact's "data" list.
+    """
+
+    def __init__(self, tables, columns, postings, identifiers=None):
+        self.tables = tables  # [table name, ...]
+        self.columns = columns  # [[column name, ...] per table]
+        self.postings = postings  # { token: [table, row, column, table, row, column, ...] }
+        # [[identifier column, ...] per table]; indexes saved before these were
+        # recorded have none
+        self.identifiers = identifiers or [[] for _ in tables]
+
+    @classmethod
+    def build(cls, data):
+        """Indexes the tables of a loaded tables.json document."""
+        tables, columns, postings, identifiers = [], [], {}, []
+        for t, (table_name, table_info) in enumerate(data.get("tables", {}).items()):
+            column_ids = {}
+            column_values = []  # [[value, ...] per column]
+            for r, row in enumerate(table_info.get("data", [])):
+                for column, value in row.items():
+                    if value is None:
+                        continue
+                    c = column_ids.setdefault(column, len(column_ids))
+                    if c == len(column_values):
+                        column_values.append([])
+                    column_values[c].append(value)
+                    for token in set(tokenize(value)):
+                        postings.setdefault(token, []).extend((t, r, c))
+            tables.append(table_name)
+            columns.append(list(column_ids))
+            identifiers.append([
+                c for c, values in enumerate(column_values)
+                if len(set(map(str, values))) >= IDENTIFIER_MIN_DISTINCT * len(values)
+            ])
+        return cls(tables, columns, postings, identifiers)
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "tables": self.tables, "columns": self.columns,
+                "postings": self.postings, "identifiers": self.identifiers
+            }, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["tables"], data["columns"], data["postings"], data.get("identifiers"))
+
+    def lookup(self, token):
+        """Positions of one token as (table name, row, column name) tuples."""
+        flat = self.postings.get(token, [])
+        return [
+            (self.tables[t], r, self.columns[t][c])
+            for t, r, c in zip(flat[0::3], flat[1::3], flat[2::3])
+        ]
+
+    def search(self, question, max_rows=MAX_LOOKUP_ROWS, any_column=False):
+        """
+        Rows matching the selective tokens of a question, best first.
+        :param any_column: Match values in every column, not only in identifier
+            columns.
+        :return: List of (table name, row) pairs, empty when nothing selective matched.
+        """
+        identifiers = [set(columns) for columns in self.identifiers]
+        scores = {}
+        for token in set(tokenize(question)) - STOPWORDS:
+            flat = self.postings.get(token)
+            if not flat:
+                continue
+            rows = {
+                (t, r) for t, r, c in zip(flat[0::3], flat[1::3], flat[2::3])
+                if any_column or c in identifiers[t]
+            }
+            if len(rows) > max_rows:
+                continue
+            for row in rows:
+                scores[row] = scores.get(row, 0) + 1
+        ranked = sorted(scores, key=lambda row: (-scores[row], row))[:max_rows]
+        return [(self.tables[t], r) for t, r in ranked]
+
+
+@traced("value_index.build")
+def build_value_index(json_file_path="tables.json"):
+    """Indexes a written tables.json and saves the index next to it."""
+    index = ValueIndex.build(_load_json(json_file_path))
+    index.save(value_index_path(json_file_path))
+    return index
+
+
+def _load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+_indexes = FileCache(ValueIndex.load, MAX_LOADED)
+_tables = FileCache(_load_json, MAX_LOADED)
+
+
+def load_value_index(json_file_path="tables.json"):
+    """Loads the index of a tables.json, re-reading it only when the file changed."""
+    path = value_index_path(json_file_path)
+    if not os.path.exists(path):
+        return None
+    return _indexes.get(path)
+
+
+def lookup_tables_csv(question, json_file_path="tables.json", max_rows=MAX_LOOKUP_ROWS):
+    """
+    The rows a lookup question is about, as CSV with their header row, so a
+    prompt can carry those instead of whole tables. A question is a lookup when
+    is_lookup() allows it and it names a value of an identifier column, or any
+    value in the "what is X's Y" form.
+    :return: { table name: csv string }, empty when the question is not a lookup
+        (or the artifact has no index yet).
+    """
+    if not is_lookup(question):
+        return {}
+    index = load_value_index(json_file_path)
+    if index is None or not os.path.exists(json_file_path):
+        return {}
+    if os.path.getmtime(json_file_path) > os.path.getmtime(value_index_path(json_file_path)):
+        return {}  # Written by something that did not re-index it
+    matches = {}
+    for table_name, row in index.search(question, max_rows, bool(POSSESSIVE_LOOKUP.search(question))):
+        matches.setdefault(table_name, []).append(row)
+    if not matches:
+        return {}
+
+    tables = _tables.get(json_file_path)["tables"]
+    csv_outputs = {}
+    for table_name, rows in matches.items():
+        records = tables[table_name]["data"]
+        columns = index.columns[index.tables.index(table_name)]
+        df = pd.DataFrame([records[r] for r in sorted(rows)], columns=columns)
+        csv_outputs[table_name] = df.to_csv(index=False)
+    return csv_outputs
@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+from modules.columntypes import infer_column
+
+
+@pytest.mark.parametrize("values", [
+    ["+2348012345678", "+2348098765432"],  # Phone numbers keep their "+"
+    ["1E5", "2.5"],  # Exponent notation
+    ["3.10", "2.5"],  # Trailing zeros after the decimal point
+    ["007", "12"],  # Leading zeros
+    ["-0", "5"],
+    [".5", "1.5"],
+])
+def test_numbers_that_do_not_round_trip_stay_text(values):
+    typed, type_name = infer_column(pd.Series(values, dtype=object))
+    assert type_name == "string"
+    assert typed.tolist() == values
+
+
+def test_integers():
+    typed, type_name = infer_column(pd.Series(["12", "-3", None], dtype=object))
+    assert type_name == "integer"
+    assert typed.tolist()[:2] == [12, -3]
+    assert typed.isna().tolist() == [False, False, True]
+
+
+def test_floats():
+    typed, type_name = infer_column(pd.Series(["1.5", "2", "-0.25"], dtype=object))
+    assert type_name == "float"
+    assert typed.tolist() == [1.5, 2.0, -0.25]
@@ -0,0 +1,57 @@
+import os
+import threading
+import time
+from modules.filecache import FileCache
+
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_loads_once_per_version(tmp_path):
+    path = str(tmp_path / "a.json")
+    write(path, "1")
+    loads = []
+    cache = FileCache(lambda p: loads.append(p) or open(p).read(), 4)
+    assert cache.get(path) == "1" and cache.get(path) == "1"
+    write(path, "2")
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    assert cache.get(path) == "2"
+    assert len(loads) == 2
+
+
+def test_concurrent_callers_share_one_load(tmp_path):
+    path = str(tmp_path / "a.json")
+    write(path, "1")
+    loads = []
+
+    def slow_load(p):
+        loads.append(p)
+        time.sleep(0.2)
+        return p
+
+    cache = FileCache(slow_load, 4)
+    threads = [threading.Thread(target=cache.get, args=(path,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+
+
+def test_evicts_least_recently_used_and_deleted_files(tmp_path):
+    paths = [str(tmp_path / f"{i}.json") for i in range(4)]
+    for path in paths:
+        write(path, path)
+    evicted = []
+    cache = FileCache(lambda p: p, 2, on_evict=evicted.append)
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+    assert evicted == [paths[1]]
+    os.remove(paths[0])
+    cache.get(paths[3])
+    assert evicted == [paths[1], paths[0]]
+    assert len(cache) == 2
@@ -0,0 +1,60 @@
+import json
+import os
+import openpyxl
+import pytest
+from modules.incrementaldetection import detect_tables_incremental
+from modules.sheetprocessor import detect_tables
+from modules.valueindex import value_index_path
+
+FILES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "files")
+# 2_PHONE_LIST.xlsx and 2_saledoc10#2TW.xlsx have merged cells
+SHEETS = ["report2.xlsx", "Titanic.xlsx", "2_PHONE_LIST.xlsx", "2_saledoc10#2TW.xlsx"]
+
+
+def unmerged_copy(file_name, path):
+    """A copy of a files/ workbook with its merged cells split, so any cell can be edited."""
+    workbook = openpyxl.load_workbook(os.path.join(FILES_DIR, file_name))
+    for sheet in workbook.worksheets:
+        for cells in list(sheet.merged_cells.ranges):
+            sheet.unmerge_cells(str(cells))
+    workbook.save(path)
+    return workbook
+
+
+def edit(workbook, path):
+    """Edits values inside a table, clears a cell and adds a small table beside the data."""
+    sheet = workbook.active
+    filled = [cell for row in sheet.iter_rows() for cell in row if cell.value is not None]
+    for cell in filled[len(filled) // 3::max(1, len(filled) // 5)]:
+        cell.value = f"edited {cell.coordinate}"
+    filled[len(filled) // 2].value = None
+    column = sheet.max_column + 3
+    for row in range(2, 6):
+        for offset in range(3):
+            sheet.cell(row=row, column=column + offset, value=row * 10 + offset)
+    workbook.save(path)
+
+
+def read_outputs(json_path):
+    with open(json_path, encoding="utf-8") as f:
+        tables = json.load(f)
+    with open(value_index_path(json_path), encoding="utf-8") as f:
+        index = json.load(f)
+    return tables, index
+
+
+@pytest.mark.parametrize("file_name", SHEETS)
+def test_incremental_matches_full_detection_after_edits(tmp_path, file_name):
+    path = str(tmp_path / "sheet.xlsx")
+    state_dir = str(tmp_path / "states")
+    workbook = unmerged_copy(file_name, path)
+    detect_tables_incremental(path, False, str(tmp_path / "before.json"), None, state_dir, "sheet")
+
+    edit(workbook, path)
+    incremental_count, _ = detect_tables_incremental(
+        path, False, str(tmp_path / "incremental.json"), None, state_dir, "sheet"
+    )
+    full_count, _ = detect_tables(path, False, str(tmp_path / "full.json"))
+
+    assert incremental_count == full_count
+    assert read_outputs(str(tmp_path / "incremental.json")) == read_outputs(str(tmp_path / "full.json"))
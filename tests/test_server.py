@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+import pytest
+from api import server as api_server
+from api.server import serve
+
+FILES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "files")
+SHEET = os.path.join(FILES_DIR, "report2.xlsx")
+
+
+@pytest.fixture
+def api(tmp_path):
+    """A running API on a free port whose answers come from a stub."""
+    release = threading.Event()
+    release.set()
+
+    def answer(question, json_file_path):
+        release.wait(10)
+        assert os.path.exists(json_file_path)
+        return f"stub answer to {question}"
+
+    server, service = serve(port=0, workers=1, queue_size=2, answer_fn=answer, work_dir=str(tmp_path))
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield url, release, service
+    release.set()
+    server.shutdown()
+    service.shutdown()
+
+
+def post(url, body):
+    data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+    request = urllib.request.Request(url, data=data, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+
+
+def test_ask_streams_one_ndjson_line_per_file(api):
+    url, _, service = api
+    status, headers, body = post(url + "/ask", {"files": [{"path": SHEET}, {"path": SHEET}], "question": "total?"})
+    assert status == 200
+    assert headers["Content-Type"] == "application/x-ndjson"
+    results = [json.loads(line) for line in body.splitlines()]
+    assert len(results) == 2
+    for result in results:
+        assert result["status"] == "ok"
+        assert result["total_tables"] > 0
+        assert result["answer"] == "stub answer to total?"
+    assert service.pending() == 0
+
+
+def test_detect_bbox(api):
+    url, _, _ = api
+    status, _, body = post(url + "/detect_bbox", {"files": [{"path": SHEET}]})
+    assert status == 200
+    assert json.loads(body.splitlines()[0])["tables"]
+
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    {"files": []},
+    {"files": ["files/report2.xlsx"]},
+    {"files": [{"name": "a.xlsx"}]},
+    {"files": [{"path": SHEET}]},  # /ask without a question
+])
+def test_bad_requests(api, body):
+    url, _, service = api
+    status, _, _ = post(url + "/ask", body)
+    assert status == 400
+    assert service.pending() == 0
+
+
+def test_too_many_files(api):
+    url, _, _ = api
+    status, _, _ = post(url + "/detect", {"files": [{"path": SHEET}] * 3})
+    assert status == 413
+
+
+def test_body_too_large(api, monkeypatch):
+    url, _, _ = api
+    monkeypatch.setattr(api_server, "MAX_BODY_BYTES", 10)
+    status, _, _ = post(url + "/detect", {"files": [{"path": SHEET}]})
+    assert status == 413
+
+
+def test_busy_queue_returns_429_with_retry_after(api):
+    url, release, service = api
+    release.clear()
+    first = threading.Thread(target=post, args=(url + "/ask", {"files": [{"path": SHEET}] * 2, "question": "q"}))
+    first.start()
+    try:
+        for _ in range(100):
+            if service.pending() == 2:
+                break
+            threading.Event().wait(0.05)
+        status, headers, _ = post(url + "/detect", {"files": [{"path": SHEET}]})
+        assert status == 429
+        assert headers["Retry-After"] == "1"
+    finally:
+        release.set()
+        first.join()
+    assert service.pending() == 0
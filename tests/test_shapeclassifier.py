@@ -0,0 +1,66 @@
+import glob
+import os
+import numpy as np
+import pytest
+from sklearn.cluster import DBSCAN
+from modules.evaluationdetection import cluster_cells
+from modules.shapeclassifier import grid_labels
+from modules.sheetreader import read_sheet, occupied_cells
+
+FILES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "files")
+SHEETS = sorted(glob.glob(os.path.join(FILES_DIR, "*.xls*")))
+
+
+@pytest.mark.parametrize("path", SHEETS, ids=os.path.basename)
+def test_same_labels_as_dbscan_on_files(path):
+    cell_indices = occupied_cells(read_sheet(path))
+    if len(cell_indices) == 0:
+        pytest.skip("empty sheet")
+    expected = DBSCAN(eps=1.4, min_samples=2).fit(cell_indices).labels_
+    assert (cluster_cells(cell_indices, eps=1.4, min_samples=2) == expected).all()
+    labels = grid_labels(cell_indices, 1.4, 2)
+    if labels is not None:
+        assert (labels == expected).all()
+
+
+def test_dense_table_takes_the_fast_path():
+    cell_indices = occupied_cells(read_sheet(os.path.join(FILES_DIR, "Titanic.xlsx")))
+    assert grid_labels(cell_indices, 1.4, 2) is not None
+
+
+@pytest.mark.parametrize("eps, min_samples", [(1.4, 2), (1.0, 2), (1.2, 1)])
+def test_same_labels_as_dbscan_on_random_grids(eps, min_samples):
+    rng = np.random.default_rng(0)
+    for trial in range(500):
+        height, width = rng.integers(1, 30, 2)
+        if trial % 2:
+            grid = rng.random((height, width)) < rng.random()
+        else:
+            # Solid blocks, some with holes
+            grid = np.zeros((height, width), dtype=bool)
+            for _ in range(rng.integers(1, 6)):
+                r, c = rng.integers(0, height), rng.integers(0, width)
+                grid[r:r + rng.integers(1, 8), c:c + rng.integers(1, 8)] = True
+            grid &= rng.random((height, width)) < 0.97
+        cell_indices = np.argwhere(grid) + rng.integers(0, 5, 2)
+        if len(cell_indices) == 0:
+            continue
+        if trial % 7 == 0:
+            cell_indices = cell_indices[rng.permutation(len(cell_indices))]
+        labels = grid_labels(cell_indices, eps, min_samples)
+        if labels is not None:
+            assert (labels == DBSCAN(eps=eps, min_samples=min_samples).fit(cell_indices).labels_).all()
+
+
+def test_other_parameters_fall_back():
+    cell_indices = np.argwhere(np.ones((4, 4), dtype=bool))
+    assert grid_labels(cell_indices, 2.0, 2) is None
+    assert grid_labels(cell_indices, 1.4, 3) is None
+
+
+def test_sparse_grids_fall_back():
+    # Two small tables far apart: a 2000 x 2000 grid for 8 cells
+    cell_indices = np.array([[0, 0], [0, 1], [1, 0], [1, 1],
+                             [1998, 1998], [1998, 1999], [1999, 1998], [1999, 1999]])
+    assert grid_labels(cell_indices, 1.4, 2) is None
+    assert grid_labels(cell_indices[:4], 1.4, 2) is not None
@@ -0,0 +1,41 @@
+import glob
+import os
+import numpy as np
+import pytest
+from sklearn.cluster import DBSCAN
+from modules.sheetreader import read_sheet, occupied_cells
+from modules.tiledclustering import tiled_dbscan
+
+FILES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "files")
+SHEETS = sorted(glob.glob(os.path.join(FILES_DIR, "*.xls*")))
+# (eps, min_samples, band_rows, workers)
+PARAMETERS = [
+    (1.4, 2, 5000, 1),
+    (1.4, 2, 7, 1),
+    (1.5, 3, 3, 1),
+    (2.5, 4, 5, 1),
+    (1.0, 1, 1, 1),
+    (2.0, 5, 4, 2),
+]
+
+
+@pytest.mark.parametrize("eps, min_samples, band_rows, workers", PARAMETERS)
+@pytest.mark.parametrize("path", SHEETS, ids=os.path.basename)
+def test_same_labels_as_dbscan_on_files(path, eps, min_samples, band_rows, workers):
+    cell_indices = occupied_cells(read_sheet(path))
+    expected = DBSCAN(eps=eps, min_samples=min_samples).fit(cell_indices).labels_ if len(cell_indices) else []
+    labels = tiled_dbscan(cell_indices, eps, min_samples, band_rows, workers)
+    assert (labels == expected).all()
+
+
+@pytest.mark.parametrize("eps, min_samples, band_rows, workers", PARAMETERS)
+def test_same_labels_as_dbscan_on_random_grids(eps, min_samples, band_rows, workers):
+    rng = np.random.default_rng(0)
+    for trial in range(20 if workers > 1 else 200):
+        height, width = rng.integers(1, 40, 2)
+        grid = rng.random((height, width)) < rng.random()
+        cell_indices = np.argwhere(grid) + rng.integers(0, 5, 2)
+        if len(cell_indices) == 0:
+            continue
+        labels = tiled_dbscan(cell_indices, eps, min_samples, band_rows, workers)
+        assert (labels == DBSCAN(eps=eps, min_samples=min_samples).fit(cell_indices).labels_).all()